@@ -3,9 +3,11 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
 from app.models.database import get_db
 from app.services.keycloak_service import KeycloakService
+from app.services.token_cache import TokenCache
 
 security = HTTPBearer(auto_error=False)
 keycloak_service = KeycloakService()
+token_cache = TokenCache()
 
 
 async def get_current_user(
@@ -28,8 +30,14 @@ async def get_current_user(
         )
 
     token = credentials.credentials
+    user_info = token_cache.get(token)
+    if user_info is not None:
+        return user_info
+
     try:
-        user_info = keycloak_service.verify_token(token)
+        claims = await keycloak_service.adecode_token(token)
+        user_info = keycloak_service.user_from_claims(claims)
+        token_cache.put(token, user_info, claims.get("exp"))
         return user_info
     except Exception:
         raise HTTPException(
@@ -1,6 +1,8 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.routes import nodes, documents, submissions, users
+from app.api.dependencies import keycloak_service
+from app.api import compression, metrics, query_budget
 
 app = FastAPI(title="DocuForms API", version="0.1.0")
 
@@ -11,15 +13,28 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Last-Modified", "X-Next-Cursor"],
 )
 
+app.add_middleware(compression.CompressionMiddleware)
+
+if query_budget.QUERY_BUDGET:
+    app.add_middleware(query_budget.QueryBudgetMiddleware)
+app.add_middleware(metrics.MetricsMiddleware)
+
 # Include routers
+app.include_router(metrics.router)
 app.include_router(nodes.router)
 app.include_router(documents.router)
 app.include_router(submissions.router)
 app.include_router(users.router)
 
 
+@app.on_event("shutdown")
+async def shutdown():
+    await keycloak_service.aclose()
+
+
 @app.get("/")
 def root():
     return {"message": "DocuForms API"}
@@ -0,0 +1,152 @@
+import os
+import time
+from fastapi import APIRouter, Response
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from app.models.database import async_engine
+from app.services.instrumentation import RequestStats, checkout_observers, current_request_stats
+from app.api.dependencies import token_cache
+
+router = APIRouter(tags=["metrics"])
+
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Request latency by route",
+    ["method", "route", "status"],
+)
+REQUEST_SIZE = Histogram(
+    "http_request_size_bytes",
+    "Request body size by route",
+    ["method", "route"],
+    buckets=SIZE_BUCKETS,
+)
+RESPONSE_SIZE = Histogram(
+    "http_response_size_bytes",
+    "Response body size by route",
+    ["method", "route"],
+    buckets=SIZE_BUCKETS,
+)
+SQL_STATEMENTS = Histogram(
+    "http_request_sql_statements",
+    "SQL statements executed per request",
+    ["method", "route"],
+    buckets=STATEMENT_BUCKETS,
+)
+SQL_DURATION = Histogram(
+    "http_request_sql_duration_seconds",
+    "Total SQL time per request",
+    ["method", "route"],
+)
+POOL_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent acquiring a database connection from the pool",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+checkout_observers.append(POOL_CHECKOUT_WAIT.observe)
+
+
+class RuntimeCollector:
+    """Pool and auth cache figures read at scrape time (nothing on the request path)"""
+
+    def collect(self):
+        pool = async_engine.pool
+        if hasattr(pool, "checkedout"):
+            gauges = {
+                "db_pool_size": ("Configured pool size", pool.size()),
+                "db_pool_checked_out": ("Connections currently checked out", pool.checkedout()),
+                "db_pool_overflow": ("Connections open beyond pool_size", max(pool.overflow(), 0)),
+            }
+            for name, (documentation, value) in gauges.items():
+                yield GaugeMetricFamily(name, documentation, value=value)
+
+        stats = token_cache.stats()
+        hits = CounterMetricFamily("auth_token_cache_hits", "Verified-token cache hits")
+        hits.add_metric([], stats["hits"])
+        yield hits
+        misses = CounterMetricFamily("auth_token_cache_misses", "Verified-token cache misses")
+        misses.add_metric([], stats["misses"])
+        yield misses
+        yield GaugeMetricFamily("auth_token_cache_entries", "Verified tokens cached", value=stats["size"])
+
+
+runtime_collector = RuntimeCollector()
+REGISTRY.register(runtime_collector)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency, body sizes and SQL work per route template"""
+
+    def __init__(self, app):
+        self.app = app
+        self._routes = None
+
+    def _route_for(self, scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        if self._routes is None:
+            self._routes = {
+                route.endpoint: route.path
+                for route in scope["app"].routes
+                if hasattr(route, "endpoint")
+            }
+        return self._routes.get(endpoint, "unmatched")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        stats = RequestStats()
+        token = current_request_stats.set(stats)
+        status = 500
+        response_size = 0
+
+        async def send_wrapper(message):
+            nonlocal status, response_size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                response_size += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_request_stats.reset(token)
+            route = self._route_for(scope)
+            method = scope["method"]
+            REQUEST_LATENCY.labels(method, route, str(status)).observe(time.perf_counter() - start)
+            request_size = 0
+            for name, value in scope["headers"]:
+                if name == b"content-length":
+                    request_size = int(value)
+                    break
+            REQUEST_SIZE.labels(method, route).observe(request_size)
+            RESPONSE_SIZE.labels(method, route).observe(response_size)
+            SQL_STATEMENTS.labels(method, route).observe(stats.statements)
+            SQL_DURATION.labels(method, route).observe(stats.sql_seconds)
+
+
+@router.get("/metrics", include_in_schema=False)
+def metrics():
+    """Prometheus scrape endpoint"""
+    registry = REGISTRY
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        # Aggregate every uvicorn worker's samples; the pool and token cache
+        # figures are those of the worker answering the scrape
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(runtime_collector)
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,112 @@
+import logging
+import os
+from collections import Counter
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Tuple
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from app.models.database import async_engine
+from app.services.instrumentation import RequestStats, call_site, current_request_stats
+
+logger = logging.getLogger(__name__)
+
+# Statements a request may run before it is reported; unset disables the check
+QUERY_BUDGET = os.getenv("QUERY_BUDGET")
+
+
+def summarize_queries(queries: List[Tuple[str, str]], limit: int = 5) -> str:
+    """Describe the statements run most often and where they were issued from"""
+    by_statement = Counter(statement for statement, _ in queries)
+    lines = []
+    for statement, count in by_statement.most_common(limit):
+        sites = Counter(site for text, site in queries if text == statement)
+        where = ", ".join(f"{site} x{n}" for site, n in sites.most_common(3))
+        lines.append(f"  {count}x {' '.join(statement.split())[:200]}\n    from {where}")
+    return "\n".join(lines)
+
+
+class QueryBudgetMiddleware:
+    """ASGI middleware that logs requests issuing more SQL statements than budget.
+
+    Repeated statements are listed with their call sites, which is usually
+    enough to spot a lazy-loaded relationship being walked in a loop.
+    """
+
+    def __init__(self, app, budget: Optional[int] = None):
+        self.app = app
+        self.budget = budget if budget is not None else int(QUERY_BUDGET or "0")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # Share the stats of an outer MetricsMiddleware so both see the same work
+        stats = current_request_stats.get()
+        token = None
+        if stats is None:
+            stats = RequestStats()
+            token = current_request_stats.set(stats)
+        stats.queries = []
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            if token is not None:
+                current_request_stats.reset(token)
+            if stats.statements > self.budget:
+                logger.warning(
+                    "%s %s ran %d SQL statements (budget %d):\n%s",
+                    scope["method"],
+                    scope["path"],
+                    stats.statements,
+                    self.budget,
+                    summarize_queries(stats.queries),
+                )
+            stats.queries = None
+
+
+class QueryCounter:
+    """Statements seen while a count_queries block is active"""
+
+    def __init__(self):
+        self.queries: List[Tuple[str, str]] = []
+
+    @property
+    def count(self) -> int:
+        return len(self.queries)
+
+    def _fail(self, message: str) -> None:
+        raise AssertionError(f"{message}\n{summarize_queries(self.queries, limit=len(self.queries))}")
+
+    def assert_count(self, expected: int) -> None:
+        """Fail unless exactly expected statements were run"""
+        if self.count != expected:
+            self._fail(f"Expected {expected} SQL statements, got {self.count}")
+
+    def assert_at_most(self, budget: int) -> None:
+        """Fail if more than budget statements were run"""
+        if self.count > budget:
+            self._fail(f"Expected at most {budget} SQL statements, got {self.count}")
+
+
+@contextmanager
+def count_queries(engine: AsyncEngine = async_engine) -> Iterator[QueryCounter]:
+    """Count every statement run on engine inside the block, whichever task runs it.
+
+    Meant for tests pinning an endpoint's query count::
+
+        with count_queries() as queries:
+            client.get("/api/nodes/")
+        queries.assert_count(3)
+    """
+    counter = QueryCounter()
+    target = engine.sync_engine if isinstance(engine, AsyncEngine) else engine
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        counter.queries.append((statement, call_site(__file__)))
+
+    event.listen(target, "after_cursor_execute", record)
+    try:
+        yield counter
+    finally:
+        event.remove(target, "after_cursor_execute", record)
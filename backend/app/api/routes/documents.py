@@ -1,86 +1,391 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+import difflib
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from app.models.database import Document, TreeNode, get_db
-from app.schemas.document import DocumentCreate, DocumentUpdate, DocumentResponse
+from app.schemas.document import (
+    DocumentCreate,
+    DocumentUpdate,
+    DocumentResponse,
+    DocumentSummaryResponse,
+    DocumentRevisionSummary,
+    DocumentRevisionResponse,
+    DocumentDiffResponse,
+    FormSchemaResponse,
+    DocumentSearchResult,
+)
 from app.api.dependencies import get_current_user, require_admin
+from app.services import form_schema, node_tree, revisions, search
+from app.utils import fast_json
+from app.utils.http_cache import etag_matches, http_date, not_modified_since
+from app.utils.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, NEXT_CURSOR_HEADER, decode_cursor, encode_cursor
 
 router = APIRouter(prefix="/api/documents", tags=["documents"])
 
+# Columns of DocumentSummaryResponse, in field order
+SUMMARY_COLUMNS = (
+    Document.id,
+    Document.node_id,
+    Document.title,
+    Document.version,
+    Document.created_at,
+    Document.updated_at,
+)
+# Columns of DocumentResponse, in field order
+DOCUMENT_COLUMNS = (
+    Document.title,
+    Document.content,
+    Document.id,
+    Document.node_id,
+    Document.version,
+    Document.created_at,
+    Document.updated_at,
+)
+
+
+def _filter_documents(
+    query,
+    node_id: Optional[int],
+    include_descendants: bool,
+    after: Optional[str],
+):
+    """Apply the shared list filters and keyset ordering to a documents select"""
+    query = query.where(Document.node_id.not_in(node_tree.hidden_ids()))
+    if node_id:
+        if include_descendants:
+            query = query.where(Document.node_id.in_(node_tree.subtree_ids(node_id)))
+        else:
+            query = query.where(Document.node_id == node_id)
+    if after:
+        (last_id,) = decode_cursor(after, 1)
+        query = query.where(Document.id > last_id)
+    return query.order_by(Document.id)
+
+
+def document_etag(document) -> str:
+    """Strong validator for a document's current state (title edits keep the version)"""
+    return f'"doc-{document.id}-{document.version}-{document.updated_at.timestamp():.6f}"'
+
+
+def _page(documents, response: Response, limit: int):
+    """Trim the extra row fetched past limit and advertise the next cursor"""
+    if len(documents) > limit:
+        documents = documents[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(documents[-1].id)
+    return documents
+
+
+def _fast_page(rows, limit: int) -> Response:
+    """_page for column rows, encoded directly (see app.utils.fast_json)"""
+    headers = {}
+    if len(rows) > limit:
+        rows = rows[:limit]
+        headers[NEXT_CURSOR_HEADER] = encode_cursor(rows[-1].id)
+    return fast_json.json_response([row._asdict() for row in rows], headers)
+
 
 @router.get("/", response_model=List[DocumentResponse])
-def get_documents(
+async def get_documents(
+    response: Response,
     node_id: Optional[int] = None,
-    db: Session = Depends(get_db),
+    include_descendants: bool = False,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = Query(None, description="Cursor from the previous page's X-Next-Cursor header"),
+    db: AsyncSession = Depends(get_db),
 ):
-    """Get all documents, optionally filtered by node_id"""
-    query = db.query(Document)
-    if node_id:
-        query = query.filter(Document.node_id == node_id)
-    return query.all()
+    """Get documents ordered by id, optionally filtered by node_id (and its subtree).
+
+    Results are paged by keyset: when more rows exist the X-Next-Cursor
+    response header holds the value to pass as `after` for the next page.
+    """
+    if fast_json.FAST_JSON:
+        query = _filter_documents(select(*DOCUMENT_COLUMNS), node_id, include_descendants, after)
+        return _fast_page((await db.execute(query.limit(limit + 1))).all(), limit)
+    query = _filter_documents(select(Document), node_id, include_descendants, after)
+    documents = (await db.execute(query.limit(limit + 1))).scalars().all()
+    return _page(documents, response, limit)
+
+
+@router.get("/summary", response_model=List[DocumentSummaryResponse])
+async def get_document_summaries(
+    response: Response,
+    node_id: Optional[int] = None,
+    include_descendants: bool = False,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = Query(None, description="Cursor from the previous page's X-Next-Cursor header"),
+    db: AsyncSession = Depends(get_db),
+):
+    """Same listing as GET /api/documents, without reading the MDX content column"""
+    query = _filter_documents(select(*SUMMARY_COLUMNS), node_id, include_descendants, after)
+    documents = (await db.execute(query.limit(limit + 1))).all()
+    if fast_json.FAST_JSON:
+        return _fast_page(documents, limit)
+    return _page(documents, response, limit)
+
+
+@router.get("/search", response_model=List[DocumentSearchResult])
+async def search_documents(
+    response: Response,
+    q: str = Query(..., min_length=1, description="Words to find in document titles and content"),
+    node_id: Optional[int] = None,
+    include_descendants: bool = False,
+    limit: int = Query(20, ge=1, le=100),
+    after: Optional[str] = Query(None, description="Cursor from the previous page's X-Next-Cursor header"),
+    db: AsyncSession = Depends(get_db),
+):
+    """Full-text search over document titles and MDX content, best matches first.
+
+    Results are paged like the listings: follow X-Next-Cursor via `after`.
+    """
+    cursor = decode_cursor(after, 2) if after else None
+    rows = await db.run_sync(
+        search.search_documents, q, node_id, include_descendants, limit + 1, cursor
+    )
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(rows[-1].rank, rows[-1].id)
+    return rows
+
+
+def _validators(document) -> dict:
+    return {
+        "ETag": document_etag(document),
+        "Last-Modified": http_date(document.updated_at),
+        "Cache-Control": "no-cache",
+    }
 
 
 @router.get("/{document_id}", response_model=DocumentResponse)
-def get_document(document_id: int, db: Session = Depends(get_db)):
-    """Get a specific document by ID"""
-    document = db.query(Document).filter(Document.id == document_id).first()
-    if not document:
+async def get_document(
+    document_id: int,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_db),
+):
+    """Get a specific document by ID.
+
+    A matching If-None-Match (or If-Modified-Since) returns 304 after a
+    lookup of the version columns only, without reading the MDX content.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_none_match or if_modified_since:
+        current = (
+            await db.execute(
+                select(Document.id, Document.node_id, Document.version, Document.updated_at).where(
+                    Document.id == document_id
+                )
+            )
+        ).first()
+        # A document being purged is gone, whatever the client has cached
+        if current is not None and await db.run_sync(node_tree.is_hidden, current.node_id):
+            raise HTTPException(status_code=404, detail="Document not found")
+        if current is not None:
+            headers = _validators(current)
+            if if_none_match:
+                not_modified = etag_matches(if_none_match, headers["ETag"])
+            else:
+                not_modified = not_modified_since(if_modified_since, current.updated_at)
+            if not_modified:
+                return Response(status_code=304, headers=headers)
+
+    document = await db.get(Document, document_id)
+    if not document or await db.run_sync(node_tree.is_hidden, document.node_id):
         raise HTTPException(status_code=404, detail="Document not found")
+    response.headers.update(_validators(document))
     return document
 
 
+@router.get("/{document_id}/revisions", response_model=List[DocumentRevisionSummary])
+async def get_document_revisions(document_id: int, db: AsyncSession = Depends(get_db)):
+    """List the stored versions of a document, newest first"""
+    await _check_visible(db, document_id)
+    return await db.run_sync(revisions.list_revisions, document_id)
+
+
+async def _check_visible(db: AsyncSession, document_id: int) -> None:
+    """404 unless the document exists outside any subtree queued for purging"""
+    found = (
+        await db.execute(
+            select(Document.id).where(
+                Document.id == document_id, Document.node_id.not_in(node_tree.hidden_ids())
+            )
+        )
+    ).first()
+    if found is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+
+
+async def _load_revision(db: AsyncSession, document_id: int, version: int) -> dict:
+    revision = await db.run_sync(revisions.load_revision, document_id, version)
+    if revision is None:
+        raise HTTPException(status_code=404, detail=f"Version {version} not found")
+    return revision
+
+
+@router.get("/{document_id}/revisions/{version}", response_model=DocumentRevisionResponse)
+async def get_document_revision(document_id: int, version: int, db: AsyncSession = Depends(get_db)):
+    """Get the title and content of a document as of version"""
+    await _check_visible(db, document_id)
+    return await _load_revision(db, document_id, version)
+
+
+@router.get("/{document_id}/schema", response_model=FormSchemaResponse, response_model_exclude_none=True)
+async def get_document_schema(
+    document_id: int,
+    version: Optional[int] = Query(None, description="Defaults to the current version"),
+    db: AsyncSession = Depends(get_db),
+):
+    """Get the form controls compiled from a document version's MDX"""
+    current = (
+        await db.execute(
+            select(Document.version).where(
+                Document.id == document_id, Document.node_id.not_in(node_tree.hidden_ids())
+            )
+        )
+    ).scalar_one_or_none()
+    if current is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    if version is None:
+        version = current
+    form = await db.run_sync(form_schema.load_form, document_id, version)
+    if form is None:
+        raise HTTPException(status_code=404, detail=f"Version {version} not found")
+    return {"document_id": document_id, "version": version, **form.schema}
+
+
+@router.get("/{document_id}/diff", response_model=DocumentDiffResponse)
+async def get_document_diff(
+    document_id: int,
+    from_version: int = Query(..., alias="from"),
+    to_version: int = Query(..., alias="to"),
+    db: AsyncSession = Depends(get_db),
+):
+    """Unified diff of the content between two versions"""
+    await _check_visible(db, document_id)
+    old = await _load_revision(db, document_id, from_version)
+    new = await _load_revision(db, document_id, to_version)
+    diff = difflib.unified_diff(
+        old["content"].splitlines(keepends=True),
+        new["content"].splitlines(keepends=True),
+        fromfile=f"v{from_version}",
+        tofile=f"v{to_version}",
+    )
+    return {
+        "document_id": document_id,
+        "from_version": from_version,
+        "to_version": to_version,
+        "diff": "".join(diff),
+    }
+
+
 @router.post("/", response_model=DocumentResponse)
-def create_document(
+async def create_document(
     document: DocumentCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     """Create a new document (auth bypassed for now)"""
     # Verify node exists
-    node = db.query(TreeNode).filter(TreeNode.id == document.node_id).first()
-    if not node:
+    node = await db.get(TreeNode, document.node_id)
+    if not node or await db.run_sync(node_tree.is_hidden, node.id):
         raise HTTPException(status_code=404, detail="Node not found")
 
     db_document = Document(**document.dict())
     db.add(db_document)
-    db.commit()
-    db.refresh(db_document)
+    await db.flush()
+    await db.run_sync(
+        revisions.record_revision,
+        db_document.id,
+        db_document.version,
+        db_document.title,
+        db_document.content,
+        None,
+        form_schema.parse_form_schema(db_document.content),
+    )
+    await db.commit()
+    await db.refresh(db_document)
     return db_document
 
 
 @router.put("/{document_id}", response_model=DocumentResponse)
-def update_document(
+async def update_document(
     document_id: int,
     document_update: DocumentUpdate,
-    db: Session = Depends(get_db),
+    response: Response,
+    if_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db),
 ):
-    """Update a document (auth bypassed for now)"""
-    db_document = db.query(Document).filter(Document.id == document_id).first()
-    if not db_document:
-        raise HTTPException(status_code=404, detail="Document not found")
+    """Update a document (auth bypassed for now).
 
-    update_data = document_update.dict(exclude_unset=True)
-    for field, value in update_data.items():
-        setattr(db_document, field, value)
+    Send the ETag from GET as If-Match (or the version as expected_version)
+    to get 412 instead of overwriting someone else's edit.
+    """
+    db_document = await db.get(Document, document_id)
+    if not db_document or await db.run_sync(node_tree.is_hidden, db_document.node_id):
+        raise HTTPException(status_code=404, detail="Document not found")
+    if if_match is not None and not etag_matches(if_match, document_etag(db_document)):
+        raise HTTPException(status_code=412, detail="Document has been modified")
+    expected_version = document_update.expected_version
+    if expected_version is not None and expected_version != db_document.version:
+        raise HTTPException(status_code=412, detail="Document has been modified")
 
+    update_data = document_update.dict(exclude_unset=True, exclude={"expected_version"})
+    previous = (db_document.version, db_document.title, db_document.content)
+    values = dict(update_data)
     # Increment version on content update
     if "content" in update_data:
-        db_document.version += 1
+        values["version"] = db_document.version + 1
+
+    if values:
+        # Compare-and-set so a concurrent writer cannot slip in after the checks above
+        result = await db.execute(
+            update(Document)
+            .where(
+                Document.id == document_id,
+                Document.version == db_document.version,
+                Document.updated_at == db_document.updated_at,
+            )
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount != 1:
+            await db.rollback()
+            raise HTTPException(status_code=412, detail="Document has been modified")
+        if "content" in update_data:
+            version, title, content = previous
+            await db.run_sync(revisions.ensure_revision, document_id, version, title, content)
+            await db.run_sync(
+                revisions.record_revision,
+                document_id,
+                values["version"],
+                update_data.get("title", title),
+                update_data["content"],
+                (version, content),
+                form_schema.parse_form_schema(update_data["content"]),
+            )
+        elif "title" in update_data:
+            version, _, content = previous
+            await db.run_sync(revisions.retitle_revision, document_id, version, update_data["title"], content)
 
-    db.commit()
-    db.refresh(db_document)
+    await db.commit()
+    await db.refresh(db_document)
+    response.headers.update(_validators(db_document))
     return db_document
 
 
 @router.delete("/{document_id}")
-def delete_document(
+async def delete_document(
     document_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     """Delete a document (auth bypassed for now)"""
-    document = db.query(Document).filter(Document.id == document_id).first()
-    if not document:
+    # Submissions, revisions and rollups go with it through ON DELETE CASCADE
+    result = await db.execute(
+        delete(Document).where(Document.id == document_id, Document.node_id.not_in(node_tree.hidden_ids()))
+    )
+    if not result.rowcount:
         raise HTTPException(status_code=404, detail="Document not found")
-    db.delete(document)
-    db.commit()
+    await db.commit()
     return {"message": "Document deleted successfully"}
 
@@ -1,90 +1,341 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
-from app.models.database import TreeNode, get_db
-from app.schemas.node import NodeCreate, NodeUpdate, NodeResponse, NodeTreeResponse
+from collections import defaultdict
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from pydantic import TypeAdapter
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Dict, List, Optional
+from app.models.database import PurgeJob, TreeNode, get_db
+from app.schemas.node import (
+    NodeCopy,
+    NodeCopyResponse,
+    NodeCreate,
+    NodeMove,
+    NodeResponse,
+    NodeStatsResponse,
+    NodeTreeResponse,
+    NodeUpdate,
+    PurgeJobResponse,
+)
+from app.services import node_tree, purge, subtree
+from app.services.tree_cache import bump_tree_version, get_tree_version, tree_cache, tree_etag
+from app.utils import fast_json
+from app.utils.http_cache import etag_matches
 from app.api.dependencies import get_current_user, require_admin
 
 router = APIRouter(prefix="/api/nodes", tags=["nodes"])
 
+tree_adapter = TypeAdapter(List[NodeTreeResponse])
+node_tree_adapter = TypeAdapter(NodeTreeResponse)
+
 
 def build_tree(nodes: List[TreeNode], parent_id: int | None = None) -> List[NodeTreeResponse]:
-    """Build tree structure from flat list"""
-    children = [n for n in nodes if n.parent_id == parent_id]
-    result = []
-    for child in children:
-        child_data = NodeTreeResponse(
-            id=child.id,
-            name=child.name,
-            parent_id=child.parent_id,
-            created_at=child.created_at,
-            updated_at=child.updated_at,
-            children=build_tree(nodes, child.id),
-            documents=[],  # Will be populated separately if needed
-        )
-        result.append(child_data)
-    return result
+    """Build tree structure from flat list in a single pass over a parent -> children index"""
+    children_by_parent: Dict[int | None, List[TreeNode]] = defaultdict(list)
+    for node in nodes:
+        children_by_parent[node.parent_id].append(node)
+
+    def build(pid: int | None) -> List[NodeTreeResponse]:
+        return [
+            NodeTreeResponse(
+                id=child.id,
+                name=child.name,
+                parent_id=child.parent_id,
+                created_at=child.created_at,
+                updated_at=child.updated_at,
+                children=build(child.id),
+                documents=[],  # Will be populated separately if needed
+            )
+            for child in children_by_parent.get(pid, ())
+        ]
+
+    return build(parent_id)
+
+
+def _node_dict(node, children: list) -> dict:
+    # Same keys, in the same order, as NodeTreeResponse
+    return {
+        "name": node.name,
+        "id": node.id,
+        "parent_id": node.parent_id,
+        "created_at": node.created_at,
+        "updated_at": node.updated_at,
+        "children": children,
+        "documents": [],
+    }
+
+
+def build_tree_dicts(nodes, parent_id: int | None = None) -> List[dict]:
+    """build_tree for the fast JSON path: plain dicts from node rows or objects"""
+    children_by_parent: Dict[int | None, list] = defaultdict(list)
+    for node in nodes:
+        children_by_parent[node.parent_id].append(node)
+
+    def build(pid: int | None) -> List[dict]:
+        return [_node_dict(child, build(child.id)) for child in children_by_parent.get(pid, ())]
+
+    return build(parent_id)
+
+
+def _dump_tree(nodes) -> bytes:
+    if fast_json.FAST_JSON:
+        return fast_json.dumps(build_tree_dicts(nodes))
+    return tree_adapter.dump_json(build_tree(nodes))
+
+
+async def _visible_node(db: AsyncSession, node_id: int, detail: str = "Node not found") -> TreeNode:
+    """The node, or a 404 if it does not exist or lies in a subtree being purged"""
+    node = await db.get(TreeNode, node_id)
+    if node is None or await db.run_sync(node_tree.is_hidden, node_id):
+        raise HTTPException(status_code=404, detail=detail)
+    return node
+
+
+def _not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+
+def _json(body: bytes, etag: str) -> Response:
+    return Response(
+        content=body,
+        media_type="application/json",
+        headers={"ETag": etag, "Cache-Control": "no-cache"},
+    )
 
 
 @router.get("/", response_model=List[NodeTreeResponse])
-def get_nodes(db: Session = Depends(get_db)):
-    """Get all tree nodes in hierarchical structure"""
-    nodes = db.query(TreeNode).all()
-    return build_tree(nodes)
+async def get_nodes(
+    request: Request,
+    depth: Optional[int] = Query(None, ge=0, description="Levels below the roots to include; omit for all"),
+    db: AsyncSession = Depends(get_db),
+):
+    """Get all tree nodes in hierarchical structure.
+
+    Responses carry an ETag derived from the tree version; a matching
+    If-None-Match returns 304 without loading any nodes.
+    """
+    version = await db.run_sync(get_tree_version)
+    etag = tree_etag(version, depth)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return _not_modified(etag)
+
+    if depth is not None:
+        nodes = await db.run_sync(node_tree.subtree_nodes, None, depth)
+        return _json(_dump_tree(nodes), etag)
+
+    body = tree_cache.get(version)
+    if body is None:
+        if fast_json.FAST_JSON:
+            nodes = (
+                await db.execute(
+                    select(
+                        TreeNode.id, TreeNode.name, TreeNode.parent_id, TreeNode.created_at, TreeNode.updated_at
+                    )
+                    .where(TreeNode.id.not_in(node_tree.hidden_ids()))
+                    .order_by(TreeNode.id)
+                )
+            ).all()
+        else:
+            visible = select(TreeNode).where(TreeNode.id.not_in(node_tree.hidden_ids()))
+            nodes = (await db.execute(visible.order_by(TreeNode.id))).scalars().all()
+        body = _dump_tree(nodes)
+        # Only cache if no mutation committed while the nodes were loading
+        if await db.run_sync(get_tree_version) == version:
+            tree_cache.set(version, body)
+    return _json(body, etag)
+
+
+@router.get("/{node_id}/subtree", response_model=NodeTreeResponse)
+async def get_subtree(
+    node_id: int,
+    request: Request,
+    depth: Optional[int] = Query(None, ge=0, description="Levels below the node to include; omit for all"),
+    db: AsyncSession = Depends(get_db),
+):
+    """Get a node and its descendants, optionally limited to depth levels"""
+    etag = tree_etag(await db.run_sync(get_tree_version), node_id, depth)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return _not_modified(etag)
+
+    nodes = await db.run_sync(node_tree.subtree_nodes, node_id, depth)
+    root = next((n for n in nodes if n.id == node_id), None)
+    if root is None or await db.run_sync(node_tree.is_hidden, node_id):
+        raise HTTPException(status_code=404, detail="Node not found")
+    if fast_json.FAST_JSON:
+        return _json(fast_json.dumps(_node_dict(root, build_tree_dicts(nodes, root.id))), etag)
+    subtree = NodeTreeResponse(
+        id=root.id,
+        name=root.name,
+        parent_id=root.parent_id,
+        created_at=root.created_at,
+        updated_at=root.updated_at,
+        children=build_tree(nodes, root.id),
+        documents=[],
+    )
+    return _json(node_tree_adapter.dump_json(subtree), etag)
+
+
+@router.get("/purge-jobs/{job_id}", response_model=PurgeJobResponse)
+async def get_purge_job(job_id: int, db: AsyncSession = Depends(get_db)):
+    """Progress of a background subtree deletion"""
+    job = await db.get(PurgeJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Purge job not found")
+    return job
+
+
+@router.get("/{node_id}/ancestors", response_model=List[NodeResponse])
+async def get_ancestors(node_id: int, db: AsyncSession = Depends(get_db)):
+    """Get the ancestors of a node from the root down (breadcrumbs)"""
+    await _visible_node(db, node_id)
+    return await db.run_sync(node_tree.ancestor_nodes, node_id)
+
+
+@router.get("/{node_id}/stats", response_model=NodeStatsResponse)
+async def get_node_stats(node_id: int, db: AsyncSession = Depends(get_db)):
+    """Count the nodes and documents in a node's subtree"""
+    await _visible_node(db, node_id)
+    return await db.run_sync(node_tree.subtree_counts, node_id)
 
 
 @router.get("/{node_id}", response_model=NodeResponse)
-def get_node(node_id: int, db: Session = Depends(get_db)):
+async def get_node(node_id: int, db: AsyncSession = Depends(get_db)):
     """Get a specific node by ID"""
-    node = db.query(TreeNode).filter(TreeNode.id == node_id).first()
-    if not node:
-        raise HTTPException(status_code=404, detail="Node not found")
-    return node
+    return await _visible_node(db, node_id)
 
 
 @router.post("/", response_model=NodeResponse)
-def create_node(
+async def create_node(
     node: NodeCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     """Create a new tree node (auth bypassed for now)"""
+    if node.parent_id is not None:
+        await _visible_node(db, node.parent_id, "Parent node not found")
+
     db_node = TreeNode(**node.dict())
     db.add(db_node)
-    db.commit()
-    db.refresh(db_node)
+    await db.flush()
+    await db.run_sync(node_tree.add_node, db_node.id, db_node.parent_id)
+    await db.run_sync(bump_tree_version)
+    await db.commit()
+    await db.refresh(db_node)
     return db_node
 
 
+@router.post("/move", response_model=List[NodeResponse])
+async def move_nodes(
+    move: NodeMove,
+    db: AsyncSession = Depends(get_db),
+):
+    """Move several subtrees under one parent (or to the top level) in a single transaction"""
+    node_ids = list(dict.fromkeys(move.node_ids))
+    found = (
+        await db.execute(
+            select(TreeNode.id).where(TreeNode.id.in_(node_ids), TreeNode.id.not_in(node_tree.hidden_ids()))
+        )
+    ).scalars().all()
+    missing = set(node_ids) - set(found)
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Node not found: {min(missing)}")
+    if move.parent_id is not None:
+        await _visible_node(db, move.parent_id, "Parent node not found")
+        for node_id in node_ids:
+            if await db.run_sync(node_tree.is_descendant, move.parent_id, node_id):
+                raise HTTPException(
+                    status_code=400,
+                    detail="Cannot move a node under itself or one of its descendants",
+                )
+    await db.run_sync(subtree.move_subtrees, node_ids, move.parent_id)
+    await db.commit()
+    result = await db.execute(
+        select(TreeNode)
+        .where(TreeNode.id.in_(node_ids))
+        .order_by(TreeNode.id)
+        .execution_options(populate_existing=True)
+    )
+    return result.scalars().all()
+
+
+@router.post("/{node_id}/copy", response_model=NodeCopyResponse)
+async def copy_node(
+    node_id: int,
+    copy: NodeCopy,
+    db: AsyncSession = Depends(get_db),
+):
+    """Deep-copy a node, its descendants and their documents (optionally with submissions).
+
+    The copy goes next to the original unless parent_id is given (null for
+    the top level). Everything is copied with set-based inserts in one
+    transaction.
+    """
+    node = await _visible_node(db, node_id)
+    parent_id = copy.parent_id if "parent_id" in copy.model_fields_set else node.parent_id
+    if parent_id is not None:
+        await _visible_node(db, parent_id, "Parent node not found")
+
+    try:
+        counts = await db.run_sync(
+            subtree.copy_subtree, node_id, parent_id, copy.name, copy.include_submissions
+        )
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Node not found")
+    await db.commit()
+    counts["node"] = await db.get(TreeNode, counts.pop("node_id"))
+    return counts
+
+
 @router.put("/{node_id}", response_model=NodeResponse)
-def update_node(
+async def update_node(
     node_id: int,
     node_update: NodeUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     """Update a tree node (auth bypassed for now)"""
-    db_node = db.query(TreeNode).filter(TreeNode.id == node_id).first()
-    if not db_node:
-        raise HTTPException(status_code=404, detail="Node not found")
+    db_node = await _visible_node(db, node_id)
 
     update_data = node_update.dict(exclude_unset=True)
+    if "parent_id" in update_data and update_data["parent_id"] != db_node.parent_id:
+        new_parent_id = update_data["parent_id"]
+        if new_parent_id is not None:
+            await _visible_node(db, new_parent_id, "Parent node not found")
+            if await db.run_sync(node_tree.is_descendant, new_parent_id, node_id):
+                raise HTTPException(
+                    status_code=400,
+                    detail="Cannot move a node under itself or one of its descendants",
+                )
+        await db.run_sync(node_tree.move_node, node_id, new_parent_id)
+
     for field, value in update_data.items():
         setattr(db_node, field, value)
 
-    db.commit()
-    db.refresh(db_node)
+    await db.run_sync(bump_tree_version)
+    await db.commit()
+    await db.refresh(db_node)
     return db_node
 
 
 @router.delete("/{node_id}")
-def delete_node(
+async def delete_node(
     node_id: int,
-    db: Session = Depends(get_db),
+    response: Response,
+    db: AsyncSession = Depends(get_db),
 ):
-    """Delete a tree node (auth bypassed for now)"""
-    node = db.query(TreeNode).filter(TreeNode.id == node_id).first()
-    if not node:
-        raise HTTPException(status_code=404, detail="Node not found")
-    db.delete(node)
-    db.commit()
-    return {"message": "Node deleted successfully"}
+    """Delete a node with its descendants, documents and submissions (auth bypassed for now).
+
+    Subtrees larger than PURGE_SYNC_LIMIT rows are hidden at once and
+    deleted in batches by a background job; the response is then 202 with
+    the job id to poll at /api/nodes/purge-jobs/{job_id}.
+    """
+    await _visible_node(db, node_id)
+    size = await db.run_sync(purge.subtree_size, node_id, purge.PURGE_SYNC_LIMIT)
+    if sum(size.values()) > purge.PURGE_SYNC_LIMIT:
+        job = await db.run_sync(purge.hide_subtree, node_id)
+        await db.commit()
+        purge.start_job(job.id)
+        response.status_code = 202
+        return {"message": "Node deletion started", "job_id": job.id}
 
+    await db.run_sync(purge.purge_subtree, node_id)
+    await db.run_sync(bump_tree_version)
+    await db.commit()
+    return {"message": "Node deleted successfully"}
@@ -1,109 +1,332 @@
+import csv
+import io
+import json
 import logging
-from fastapi import APIRouter, Depends, HTTPException, Response
-from sqlalchemy.orm import Session
-from typing import List, Optional, Any
-from app.models.database import FormSubmission, Document, get_db
-from app.schemas.submission import SubmissionCreate, SubmissionResponse
-from app.api.dependencies import get_current_user
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import insert, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import AsyncIterable, List, Literal, Optional
+from app.models.database import AsyncSessionLocal, FormSubmission, Document, get_db
+from app.schemas.submission import (
+    SubmissionCreate,
+    SubmissionResponse,
+    SubmissionBatchCreate,
+    SubmissionBatchResponse,
+    DocumentRollupResponse,
+    RecomputeResponse,
+)
+from app.api.dependencies import get_current_user, require_admin
+from app.services import calculations, form_schema, node_tree, rollups
+from app.services.answers import CURRENT_ANSWERS_VERSION, answer_filter, is_canonical, normalize_answers
+from app.utils import fast_json
+from app.utils.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, NEXT_CURSOR_HEADER, decode_cursor, encode_cursor
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/submissions", tags=["submissions"])
 
-VALID_RESULTS = {"pass", "warning", "fail"}
-
-
-def _normalize_answers(raw: Any) -> list:
-    """Ensure answers are a list of plain dicts with id/label/value/result."""
-    if raw is None:
-        return []
-
-    # Convert Pydantic models to dicts
-    if hasattr(raw, "model_dump"):
-        raw = raw.model_dump()
-
-    # Already a list
-    if isinstance(raw, list):
-        normalized = []
-        for idx, item in enumerate(raw):
-            if hasattr(item, "model_dump"):
-                item = item.model_dump()
-            if isinstance(item, dict):
-                result = item.get("result")
-                normalized.append(
-                    {
-                        "id": item.get("id") or item.get("field_id") or item.get("name") or str(idx),
-                        "label": item.get("label") or item.get("id") or item.get("field_id") or item.get("name") or "",
-                        "value": item.get("value", item.get("answer")),
-                        "result": result if result in VALID_RESULTS else "pass",
-                    }
-                )
-            else:
-                normalized.append(
-                    {
-                        "id": str(idx),
-                        "label": str(idx),
-                        "value": item,
-                        "result": "pass",
-                    }
-                )
-        return normalized
-
-    # Dict of key -> value (legacy shape)
-    if isinstance(raw, dict):
-        return [
-          {
-              "id": str(key),
-              "label": str(key),
-              "value": value,
-              "result": "pass",
-          }
-          for key, value in raw.items()
-        ]
-
-    # Fallback single value
-    return [
-        {
-            "id": "value",
-            "label": "value",
-            "value": raw,
-            "result": "pass",
-        }
-    ]
+# Plain column reads: rows come back without ORM identity tracking
+SUBMISSION_COLUMNS = (
+    FormSubmission.id,
+    FormSubmission.document_id,
+    FormSubmission.user_id,
+    FormSubmission.answers,
+    FormSubmission.answers_version,
+    FormSubmission.submitted_at,
+)
 
+EXPORT_BATCH_SIZE = 1000
+EXPORT_FLUSH_BYTES = 64 * 1024
+EXPORT_CSV_COLUMNS = [
+    "submission_id",
+    "document_id",
+    "user_id",
+    "submitted_at",
+    "control_id",
+    "label",
+    "value",
+    "result",
+]
 
-@router.get("/", response_model=List[SubmissionResponse])
-def get_submissions(
-    document_id: Optional[int] = None,
-    db: Session = Depends(get_db),
-    current_user: dict = Depends(get_current_user),
+
+def _filter_submissions(
+    db: AsyncSession,
+    query,
+    current_user: dict,
+    document_id: Optional[int],
+    user_id: Optional[str],
+    submitted_after: Optional[datetime],
+    submitted_before: Optional[datetime],
+    control_id: Optional[str] = None,
+    control_result: Optional[str] = None,
+    control_value: Optional[str] = None,
 ):
-    """Get all submissions, optionally filtered by document_id"""
-    query = db.query(FormSubmission)
+    """Apply list filters and the admin/own-submissions visibility rule"""
+    # Submissions of documents in a subtree being purged are already gone
+    query = query.where(FormSubmission.document_id.not_in(node_tree.hidden_document_ids()))
     if document_id:
-        query = query.filter(FormSubmission.document_id == document_id)
+        query = query.where(FormSubmission.document_id == document_id)
 
     # Non-admins can only see their own submissions
     if "Admins" not in current_user.get("groups", []):
-        query = query.filter(FormSubmission.user_id == current_user["id"])
+        query = query.where(FormSubmission.user_id == current_user["id"])
+    elif user_id:
+        query = query.where(FormSubmission.user_id == user_id)
+
+    if submitted_after:
+        query = query.where(FormSubmission.submitted_at >= submitted_after)
+    if submitted_before:
+        query = query.where(FormSubmission.submitted_at < submitted_before)
+    if control_id is not None or control_result is not None or control_value is not None:
+        query = query.where(
+            answer_filter(
+                db.bind.dialect.name,
+                control_id,
+                control_result,
+                control_value,
+            )
+        )
+    return query
+
+
+def _answers(row) -> list:
+    """A row's answers in canonical shape; only legacy rows pay for normalization"""
+    if is_canonical(row.answers_version):
+        return row.answers
+    return normalize_answers(row.answers)
+
+
+def _submission_dict(row) -> dict:
+    """A submission row shaped like SubmissionResponse, without model validation"""
+    return {
+        "document_id": row.document_id,
+        "answers": _answers(row),
+        "id": row.id,
+        "user_id": row.user_id,
+        "submitted_at": row.submitted_at,
+    }
+
+
+def _submission_response(row):
+    if is_canonical(row.answers_version):
+        return row
+    data = row._asdict()
+    data["answers"] = normalize_answers(row.answers)
+    return data
+
+
+async def _stream_rows(query) -> AsyncIterable:
+    """Rows of query through a server-side cursor on a session the stream owns.
+
+    The request's get_db session may be closed before the response body has
+    been sent, so the export never reads through it.
+    """
+    async with AsyncSessionLocal() as db:
+        rows = await db.stream(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        async for row in rows:
+            yield row
+
+
+async def _export_ndjson(rows: AsyncIterable) -> AsyncIterable[str]:
+    buffer = []
+    size = 0
+    async for row in rows:
+        line = json.dumps(
+            {
+                "id": row.id,
+                "document_id": row.document_id,
+                "user_id": row.user_id,
+                "submitted_at": row.submitted_at.isoformat() if row.submitted_at else None,
+                "answers": _answers(row),
+            },
+            default=str,
+        )
+        buffer.append(line)
+        size += len(line) + 1
+        if size >= EXPORT_FLUSH_BYTES:
+            yield "\n".join(buffer) + "\n"
+            buffer = []
+            size = 0
+    if buffer:
+        yield "\n".join(buffer) + "\n"
+
+
+async def _export_csv(rows: AsyncIterable) -> AsyncIterable[str]:
+    """One CSV line per answer; non-scalar values are JSON encoded"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_CSV_COLUMNS)
+    async for row in rows:
+        submitted_at = row.submitted_at.isoformat() if row.submitted_at else ""
+        for answer in _answers(row):
+            value = answer["value"]
+            if isinstance(value, (dict, list)):
+                value = json.dumps(value, default=str)
+            writer.writerow(
+                [
+                    row.id,
+                    row.document_id,
+                    row.user_id,
+                    submitted_at,
+                    answer["id"],
+                    answer["label"],
+                    value,
+                    answer["result"],
+                ]
+            )
+        if buffer.tell() >= EXPORT_FLUSH_BYTES:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+@router.get("/", response_model=List[SubmissionResponse])
+async def get_submissions(
+    response: Response,
+    document_id: Optional[int] = None,
+    user_id: Optional[str] = None,
+    submitted_after: Optional[datetime] = None,
+    submitted_before: Optional[datetime] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = Query(None, description="Cursor from the previous page's X-Next-Cursor header"),
+    control_id: Optional[str] = Query(None, description="Only submissions with an answer for this control id"),
+    control_result: Optional[Literal["pass", "warning", "fail"]] = Query(None, description="Only answers with this result"),
+    control_value: Optional[str] = Query(None, description="Only answers with this value (JSON scalar or string)"),
+    db: AsyncSession = Depends(get_db),
+    current_user: dict = Depends(get_current_user),
+):
+    """Get submissions ordered by (submitted_at, id), optionally filtered.
+
+    Results are paged by keyset: when more rows exist the X-Next-Cursor
+    response header holds the value to pass as `after` for the next page.
+    """
+    query = _filter_submissions(
+        db,
+        select(*SUBMISSION_COLUMNS),
+        current_user,
+        document_id,
+        user_id,
+        submitted_after,
+        submitted_before,
+        control_id,
+        control_result,
+        control_value,
+    )
+    if after:
+        last_submitted_at, last_id = decode_cursor(after, 2)
+        query = query.where(
+            tuple_(FormSubmission.submitted_at, FormSubmission.id) > tuple_(last_submitted_at, last_id)
+        )
+
+    submissions = (
+        await db.execute(
+            query.order_by(FormSubmission.submitted_at, FormSubmission.id).limit(limit + 1)
+        )
+    ).all()
+    if len(submissions) > limit:
+        submissions = submissions[:limit]
+        last = submissions[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(last.submitted_at, last.id)
+    if fast_json.FAST_JSON:
+        headers = {NEXT_CURSOR_HEADER: response.headers[NEXT_CURSOR_HEADER]} if NEXT_CURSOR_HEADER in response.headers else None
+        return fast_json.json_response([_submission_dict(row) for row in submissions], headers)
+    # Legacy rows (stored as dict) are normalized into the response, never written back
+    return [_submission_response(row) for row in submissions]
+
+
+@router.get("/export")
+async def export_submissions(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    document_id: Optional[int] = None,
+    user_id: Optional[str] = None,
+    submitted_after: Optional[datetime] = None,
+    submitted_before: Optional[datetime] = None,
+    control_id: Optional[str] = Query(None, description="Only submissions with an answer for this control id"),
+    control_result: Optional[Literal["pass", "warning", "fail"]] = Query(None, description="Only answers with this result"),
+    control_value: Optional[str] = Query(None, description="Only answers with this value (JSON scalar or string)"),
+    db: AsyncSession = Depends(get_db),
+    current_user: dict = Depends(get_current_user),
+):
+    """Stream submissions as NDJSON (one per line) or CSV (one line per answer).
+
+    Rows are read through a server-side cursor in batches of
+    EXPORT_BATCH_SIZE, so memory use does not grow with the export size.
+    """
+    query = _filter_submissions(
+        db,
+        select(*SUBMISSION_COLUMNS),
+        current_user,
+        document_id,
+        user_id,
+        submitted_after,
+        submitted_before,
+        control_id,
+        control_result,
+        control_value,
+    )
+    rows = _stream_rows(query.order_by(FormSubmission.submitted_at, FormSubmission.id))
 
-    submissions = query.all()
-    # Normalize answers for response compatibility (legacy rows stored as dict)
-    for sub in submissions:
-        sub.answers = _normalize_answers(sub.answers)
-    return submissions
+    if format == "csv":
+        return StreamingResponse(
+            _export_csv(rows),
+            media_type="text/csv",
+            headers={"Content-Disposition": 'attachment; filename="submissions.csv"'},
+        )
+    return StreamingResponse(
+        _export_ndjson(rows),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="submissions.ndjson"'},
+    )
+
+
+@router.get("/aggregates", response_model=List[DocumentRollupResponse])
+async def get_submission_aggregates(
+    document_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_db),
+    admin: bool = Depends(require_admin),
+):
+    """Pass/warning/fail counts per document and per control (Admin only)"""
+    return await db.run_sync(rollups.get_rollups, document_id)
+
+
+@router.post("/recompute", response_model=RecomputeResponse)
+async def recompute_submissions(
+    document_id: int,
+    db: AsyncSession = Depends(get_db),
+    admin: bool = Depends(require_admin),
+):
+    """Re-derive Calculate values and results of a document's submissions (Admin only)
+
+    Run after changing a formula or bounds; recompute_calculations.py does
+    the same from the command line for very large documents.
+    """
+    if await db.run_sync(node_tree.is_document_hidden, document_id):
+        raise HTTPException(status_code=404, detail="Document not found")
+    try:
+        counts = await db.run_sync(calculations.recompute_document, document_id)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return {"document_id": document_id, **counts}
 
 
 @router.get("/{submission_id}", response_model=SubmissionResponse)
-def get_submission(
+async def get_submission(
     submission_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: dict = Depends(get_current_user),
 ):
     """Get a specific submission by ID"""
     submission = (
-        db.query(FormSubmission).filter(FormSubmission.id == submission_id).first()
-    )
+        await db.execute(
+            select(*SUBMISSION_COLUMNS).where(
+                FormSubmission.id == submission_id,
+                FormSubmission.document_id.not_in(node_tree.hidden_document_ids()),
+            )
+        )
+    ).first()
     if not submission:
         raise HTTPException(status_code=404, detail="Submission not found")
 
@@ -114,35 +337,33 @@ def get_submission(
     ):
         raise HTTPException(status_code=403, detail="Access denied")
 
-    submission.answers = _normalize_answers(submission.answers)
-    return submission
+    return _submission_response(submission)
 
 
 @router.delete("/{submission_id}", status_code=204)
-def delete_submission(
+async def delete_submission(
     submission_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: dict = Depends(get_current_user),
 ):
     """Delete a submission (owners or admins only)."""
-    submission = (
-        db.query(FormSubmission).filter(FormSubmission.id == submission_id).first()
-    )
-    if not submission:
+    submission = await db.get(FormSubmission, submission_id)
+    if not submission or await db.run_sync(node_tree.is_document_hidden, submission.document_id):
         raise HTTPException(status_code=404, detail="Submission not found")
 
     if "Admins" not in current_user.get("groups", []) and submission.user_id != current_user["id"]:
         raise HTTPException(status_code=403, detail="Access denied")
 
-    db.delete(submission)
-    db.commit()
+    await db.run_sync(rollups.remove_submission, submission.document_id, submission.answers)
+    await db.delete(submission)
+    await db.commit()
     return Response(status_code=204)
 
 
 @router.post("/", response_model=SubmissionResponse)
-def create_submission(
+async def create_submission(
     submission: SubmissionCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: dict = Depends(get_current_user),
 ):
     """Create a new form submission"""
@@ -153,31 +374,40 @@ def create_submission(
         submission.answers,
     )
     # Verify document exists
-    document = (
-        db.query(Document).filter(Document.id == submission.document_id).first()
-    )
-    if not document:
+    document = await db.get(Document, submission.document_id)
+    if not document or await db.run_sync(node_tree.is_hidden, document.node_id):
         raise HTTPException(status_code=404, detail="Document not found")
 
     # Normalize answers to plain dicts to store JSON (Pydantic models aren't serializable)
-    normalized_answers = _normalize_answers(submission.answers)
+    normalized_answers = normalize_answers(submission.answers)
+
+    # Check the answers against the controls compiled from this document version
+    form = await db.run_sync(form_schema.load_form, document.id, document.version)
+    problems = form.validate(normalized_answers) if form is not None else []
+    if problems:
+        raise HTTPException(status_code=422, detail=problems)
+    if form is not None:
+        # Calculate values and range/correct-answer results are derived server-side
+        normalized_answers = calculations.derive_answers(form, normalized_answers)
 
     db_submission = FormSubmission(
         document_id=submission.document_id,
         user_id=current_user["id"],
         answers=normalized_answers,
+        answers_version=CURRENT_ANSWERS_VERSION,
     )
     try:
         db.add(db_submission)
-        db.commit()
-        db.refresh(db_submission)
+        await db.run_sync(rollups.record_submission, submission.document_id, normalized_answers)
+        await db.commit()
+        await db.refresh(db_submission)
         logger.info(
             "Submission saved to database with id=%s for user_id=%s",
             db_submission.id,
             current_user.get("id"),
         )
     except Exception:
-        db.rollback()
+        await db.rollback()
         logger.exception(
             "Failed to save submission for document_id=%s user_id=%s",
             submission.document_id,
@@ -186,3 +416,93 @@ def create_submission(
         raise
     return db_submission
 
+
+@router.post("/batch", response_model=SubmissionBatchResponse)
+async def create_submissions_batch(
+    batch: SubmissionBatchCreate,
+    db: AsyncSession = Depends(get_db),
+    current_user: dict = Depends(get_current_user),
+):
+    """Create many submissions in one transaction, reporting a result per item.
+
+    Referenced documents are checked with a single query, and the rows are
+    written with batched multi-row INSERT ... RETURNING statements. Items
+    pointing at unknown documents or failing form validation are reported as
+    errors; the rest are saved.
+    """
+    document_ids = {item.document_id for item in batch.items}
+    existing = dict(
+        (
+            await db.execute(
+                select(Document.id, Document.version).where(
+                    Document.id.in_(document_ids), Document.node_id.not_in(node_tree.hidden_ids())
+                )
+            )
+        ).all()
+    )
+    forms = await db.run_sync(form_schema.load_forms, existing)
+
+    submitted_at = datetime.utcnow()
+    rows = []
+    row_indexes = []
+    results = []
+    deltas: rollups.Deltas = {}
+    for index, item in enumerate(batch.items):
+        if item.document_id not in existing:
+            results.append({"index": index, "status": "error", "detail": "Document not found"})
+            continue
+        answers = normalize_answers(item.answers)
+        form = forms.get(item.document_id)
+        problems = form.validate(answers) if form is not None else []
+        if problems:
+            results.append({"index": index, "status": "error", "detail": "; ".join(problems)})
+            continue
+        if form is not None:
+            answers = calculations.derive_answers(form, answers)
+        rollups.count_answers(deltas, item.document_id, answers)
+        rows.append(
+            {
+                "document_id": item.document_id,
+                "user_id": current_user["id"],
+                "answers": answers,
+                "answers_version": CURRENT_ANSWERS_VERSION,
+                "submitted_at": submitted_at,
+            }
+        )
+        row_indexes.append(index)
+
+    try:
+        if rows:
+            ids = (
+                await db.execute(
+                    insert(FormSubmission).returning(FormSubmission.id, sort_by_parameter_order=True),
+                    rows,
+                )
+            ).scalars().all()
+            await db.run_sync(rollups.add_counts, deltas)
+            results.extend(
+                {"index": index, "status": "created", "id": new_id}
+                for index, new_id in zip(row_indexes, ids)
+            )
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        logger.exception(
+            "Failed to save submission batch of %s items for user_id=%s",
+            len(batch.items),
+            current_user.get("id"),
+        )
+        raise
+
+    logger.info(
+        "Submission batch saved: %s created, %s failed for user_id=%s",
+        len(rows),
+        len(batch.items) - len(rows),
+        current_user.get("id"),
+    )
+    results.sort(key=lambda result: result["index"])
+    return {
+        "created": len(rows),
+        "failed": len(batch.items) - len(rows),
+        "results": results,
+    }
@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, Field
+from typing import Any, List, Optional
 from datetime import datetime
 
 
@@ -15,6 +15,8 @@ class DocumentCreate(DocumentBase):
 class DocumentUpdate(BaseModel):
     title: Optional[str] = None
     content: Optional[str] = None
+    # Reject the update with 412 unless the document is still at this version
+    expected_version: Optional[int] = None
 
 
 class DocumentResponse(DocumentBase):
@@ -26,3 +28,89 @@ class DocumentResponse(DocumentBase):
 
     class Config:
         from_attributes = True
+
+
+class DocumentSummaryResponse(BaseModel):
+    """Document listing without the MDX content"""
+    id: int
+    node_id: int
+    title: str
+    version: int
+    created_at: datetime
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class DocumentRevisionSummary(BaseModel):
+    """Revision metadata; stored_length is the size actually kept for it"""
+    version: int
+    kind: str
+    title: str
+    content_length: int
+    stored_length: int
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class DocumentRevisionResponse(BaseModel):
+    document_id: int
+    version: int
+    title: str
+    content: str
+    created_at: datetime
+
+
+class DocumentDiffResponse(BaseModel):
+    document_id: int
+    from_version: int
+    to_version: int
+    diff: str  # unified diff of the MDX content
+
+
+class FormControlBounds(BaseModel):
+    min: float
+    max: float
+
+
+class FormControlSchema(BaseModel):
+    id: str
+    type: str
+    label: str
+    required: bool = False
+    options: Optional[List[str]] = None
+    correct: Optional[Any] = None
+    pass_: Optional[FormControlBounds] = Field(None, alias="pass")
+    warn: Optional[FormControlBounds] = None
+    expression: Optional[str] = None
+    precision: Optional[int] = None
+
+    class Config:
+        populate_by_name = True
+
+
+class FormSchemaResponse(BaseModel):
+    """Controls declared in a document version's MDX, compiled when it was saved"""
+    document_id: int
+    version: int
+    schema_version: int
+    controls: List[FormControlSchema]
+    errors: List[str]
+
+
+class DocumentSearchResult(BaseModel):
+    """A search hit; highlights wrap matched terms in <mark></mark>"""
+    id: int
+    node_id: int
+    title: str
+    version: int
+    updated_at: datetime
+    rank: float
+    title_highlight: str
+    snippet: str
+
+    class Config:
+        from_attributes = True
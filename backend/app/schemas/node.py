@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, List
 from datetime import datetime
 
@@ -26,6 +26,49 @@ class NodeResponse(NodeBase):
         from_attributes = True
 
 
+class NodeStatsResponse(BaseModel):
+    node_id: int
+    descendant_count: int
+    document_count: int
+
+
+class NodeMove(BaseModel):
+    node_ids: List[int] = Field(..., min_length=1)
+    parent_id: Optional[int] = None
+
+
+class NodeCopy(BaseModel):
+    # Omitted: next to the original; null: at the top level
+    parent_id: Optional[int] = None
+    name: Optional[str] = None
+    include_submissions: bool = False
+
+
+class NodeCopyResponse(BaseModel):
+    node: NodeResponse
+    node_count: int
+    document_count: int
+    submission_count: int
+
+
+class PurgeJobResponse(BaseModel):
+    id: int
+    node_id: int
+    status: str
+    total_nodes: int
+    total_documents: int
+    total_submissions: int
+    deleted_nodes: int
+    deleted_documents: int
+    deleted_submissions: int
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
 class NodeTreeResponse(NodeResponse):
     children: List["NodeTreeResponse"] = []
     documents: List["DocumentResponse"] = []
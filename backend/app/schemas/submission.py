@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import Any, List, Literal
+from pydantic import BaseModel, Field
+from typing import Any, List, Literal, Optional
 from datetime import datetime
 
 
@@ -38,6 +38,26 @@ class SubmissionCreate(SubmissionBase):
         }
 
 
+MAX_BATCH_SIZE = 5000
+
+
+class SubmissionBatchCreate(BaseModel):
+    items: List[SubmissionCreate] = Field(..., max_length=MAX_BATCH_SIZE)
+
+
+class SubmissionBatchItemResult(BaseModel):
+    index: int
+    status: Literal["created", "error"]
+    id: Optional[int] = None
+    detail: Optional[str] = None
+
+
+class SubmissionBatchResponse(BaseModel):
+    created: int
+    failed: int
+    results: List[SubmissionBatchItemResult]
+
+
 class SubmissionResponse(SubmissionBase):
     id: int
     user_id: str
@@ -46,3 +66,28 @@ class SubmissionResponse(SubmissionBase):
     class Config:
         from_attributes = True
 
+
+class ControlRollupResponse(BaseModel):
+    control_id: str
+    label: str
+    pass_count: int
+    warning_count: int
+    fail_count: int
+
+    class Config:
+        from_attributes = True
+
+
+class DocumentRollupResponse(BaseModel):
+    document_id: int
+    pass_count: int
+    warning_count: int
+    fail_count: int
+    controls: List[ControlRollupResponse]
+
+
+class RecomputeResponse(BaseModel):
+    """Outcome of re-deriving calculated values and results for a document"""
+    document_id: int
+    scanned: int
+    updated: int
@@ -0,0 +1,170 @@
+import json
+import time
+from typing import Any, Optional
+from sqlalchemy import case, exists, func, or_, select, type_coerce, update
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Session
+from app.models.database import FormSubmission
+
+VALID_RESULTS = {"pass", "warning", "fail"}
+
+# FormSubmission.answers_version of rows stored as a list of
+# {id, label, value, result} dicts. Rows with an older (or NULL) version may
+# hold legacy shapes and must go through normalize_answers before use.
+CURRENT_ANSWERS_VERSION = 1
+
+MIGRATION_BATCH_SIZE = 1000
+
+
+def normalize_answers(raw: Any) -> list:
+    """Ensure answers are a list of plain dicts with id/label/value/result."""
+    if raw is None:
+        return []
+
+    # Convert Pydantic models to dicts
+    if hasattr(raw, "model_dump"):
+        raw = raw.model_dump()
+
+    # Already a list
+    if isinstance(raw, list):
+        normalized = []
+        for idx, item in enumerate(raw):
+            if hasattr(item, "model_dump"):
+                item = item.model_dump()
+            if isinstance(item, dict):
+                result = item.get("result")
+                normalized.append(
+                    {
+                        "id": item.get("id") or item.get("field_id") or item.get("name") or str(idx),
+                        "label": item.get("label") or item.get("id") or item.get("field_id") or item.get("name") or "",
+                        "value": item.get("value", item.get("answer")),
+                        "result": result if result in VALID_RESULTS else "pass",
+                    }
+                )
+            else:
+                normalized.append(
+                    {
+                        "id": str(idx),
+                        "label": str(idx),
+                        "value": item,
+                        "result": "pass",
+                    }
+                )
+        return normalized
+
+    # Dict of key -> value (legacy shape)
+    if isinstance(raw, dict):
+        return [
+          {
+              "id": str(key),
+              "label": str(key),
+              "value": value,
+              "result": "pass",
+          }
+          for key, value in raw.items()
+        ]
+
+    # Fallback single value
+    return [
+        {
+            "id": "value",
+            "label": "value",
+            "value": raw,
+            "result": "pass",
+        }
+    ]
+
+
+def _value_candidates(value: str) -> list:
+    """Query-string values may stand for a JSON scalar ("3", "true") or the literal string"""
+    candidates = [value]
+    try:
+        parsed = json.loads(value)
+    except ValueError:
+        return candidates
+    if isinstance(parsed, (int, float, bool)) or parsed is None:
+        candidates.append(parsed)
+    return candidates
+
+
+def answer_filter(
+    dialect: str,
+    control_id: Optional[str] = None,
+    result: Optional[str] = None,
+    value: Optional[str] = None,
+):
+    """SQL condition: some answer matches every given control id / result / value.
+
+    On PostgreSQL this is a JSONB containment test served by the GIN index on
+    answers; elsewhere (SQLite in tests) it falls back to scanning json_each.
+    Only canonical rows are matched, so run migrate_answers.py first.
+    """
+    wanted = {key: v for key, v in (("id", control_id), ("result", result)) if v is not None}
+    values = _value_candidates(value) if value is not None else [None]
+
+    if dialect == "postgresql":
+        answers = type_coerce(FormSubmission.answers, JSONB)
+        return or_(
+            *(
+                answers.contains([{**wanted, "value": v} if value is not None else wanted])
+                for v in values
+            )
+        )
+
+    answer = func.json_each(FormSubmission.answers).table_valued("value", "type").alias("answer")
+    # Legacy rows can hold scalars here, which json_extract rejects as malformed JSON
+    item = case((answer.c.type == "object", answer.c.value))
+    conditions = [func.json_extract(item, f"$.{key}") == v for key, v in wanted.items()]
+    if value is not None:
+        conditions.append(func.json_extract(item, "$.value").in_(values))
+    return exists(select(answer.c.value).where(*conditions))
+
+
+def is_canonical(answers_version: Optional[int]) -> bool:
+    return answers_version == CURRENT_ANSWERS_VERSION
+
+
+def migrate_legacy_answers(
+    db: Session,
+    batch_size: int = MIGRATION_BATCH_SIZE,
+    pause: float = 0.0,
+    progress=None,
+) -> int:
+    """Rewrite legacy answer rows into the canonical shape, one committed batch at a time.
+
+    Progress lives in the rows themselves (answers_version), so an
+    interrupted run resumes where it stopped. Returns the number of rows migrated.
+    """
+    legacy = or_(
+        FormSubmission.answers_version.is_(None),
+        FormSubmission.answers_version < CURRENT_ANSWERS_VERSION,
+    )
+    migrated = 0
+    last_id = 0
+    while True:
+        rows = db.execute(
+            select(FormSubmission.id, FormSubmission.answers)
+            .where(FormSubmission.id > last_id, legacy)
+            .order_by(FormSubmission.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            return migrated
+        db.execute(
+            update(FormSubmission),
+            [
+                {
+                    "id": row.id,
+                    "answers": normalize_answers(row.answers),
+                    "answers_version": CURRENT_ANSWERS_VERSION,
+                }
+                for row in rows
+            ],
+        )
+        db.commit()
+        last_id = rows[-1].id
+        migrated += len(rows)
+        if progress:
+            progress(migrated, last_id)
+        if pause:
+            time.sleep(pause)
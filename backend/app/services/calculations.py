@@ -0,0 +1,198 @@
+import math
+from typing import Dict, List, Optional
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+from app.models.database import Document, FormSubmission
+from app.services import rollups
+from app.services.answers import CURRENT_ANSWERS_VERSION, is_canonical, normalize_answers
+from app.services.form_schema import CompiledForm, load_form
+from app.services.formulas import finish
+
+RECOMPUTE_BATCH_SIZE = 1000
+
+
+def to_number(value) -> Optional[float]:
+    """Number(value) as the browser would read a stored answer; None when it is not numeric"""
+    if isinstance(value, bool):
+        return float(value)
+    if isinstance(value, (int, float)):
+        return float(value) if math.isfinite(value) else None
+    if isinstance(value, str) and value.strip():
+        try:
+            number = float(value)
+        except ValueError:
+            return None
+        return number if math.isfinite(number) else None
+    if isinstance(value, dict):
+        # Answers saved before the value was unwrapped from {value, result, label}
+        return to_number(value.get("value"))
+    return None
+
+
+def range_result(control: dict, value) -> Optional[str]:
+    """pass / warning / fail of a numeric value against the control's bounds (as NumberInput does)"""
+    number = to_number(value)
+    if number is None:
+        return None
+    for bound, result in (("pass", "pass"), ("warn", "warning")):
+        limits = control.get(bound)
+        if limits and limits["min"] <= number <= limits["max"]:
+            return result
+    return "fail"
+
+
+def choice_result(control: dict, value) -> Optional[str]:
+    if value is None or value == "":
+        return None
+    return "pass" if value == control["correct"] else "fail"
+
+
+def result_rule(control: dict):
+    """The server-side result rule for a control, or None to keep the submitted result"""
+    if control["type"] in ("NumberInput", "Calculate") and ("pass" in control or "warn" in control):
+        return range_result
+    if control["type"] in ("Dropdown", "RadioButtons") and "correct" in control:
+        return choice_result
+    return None
+
+
+def _answer(control: dict, value, previous: Optional[dict]) -> dict:
+    return {
+        "id": control["id"],
+        "label": previous["label"] if previous else control["label"],
+        "value": value,
+        "result": previous["result"] if previous else "pass",
+    }
+
+
+def _apply_results(form: CompiledForm, rows: List[Dict[str, dict]]) -> None:
+    for control in form.controls.values():
+        rule = result_rule(control)
+        if rule is None:
+            continue
+        control_id = control["id"]
+        for by_id in rows:
+            answer = by_id.get(control_id)
+            if answer is None:
+                continue
+            result = rule(control, answer["value"])
+            if result is not None and result != answer["result"]:
+                by_id[control_id] = {**answer, "result": result}
+
+
+def derive_columns(form: CompiledForm, rows: List[Dict[str, dict]]) -> None:
+    """Recompute Calculate values and rule-based results for many submissions in place.
+
+    rows holds one {control_id: answer} dict per submission. Each formula
+    runs once per batch over columns of its inputs, in declaration order so
+    a Calculate may read an earlier one. Formulas the server cannot compile
+    are left to the client.
+    """
+    for control, formula in form.calculations:
+        if formula is None:
+            # Not a formula the server can run (the browser may still): keep what was submitted
+            continue
+        control_id = control["id"]
+        values: List[Optional[float]] = [None] * len(rows)
+        columns = [
+            [to_number(by_id[name]["value"]) if name in by_id else None for by_id in rows]
+            for name in formula.variables
+        ]
+        # Rows missing an input get no value, like the "Waiting for" state in the browser
+        complete = [
+            index for index in range(len(rows)) if all(column[index] is not None for column in columns)
+        ]
+        results = formula.evaluate_columns(
+            [[column[index] for index in complete] for column in columns], len(complete)
+        )
+        for index, value in zip(complete, results):
+            values[index] = finish(value, control["precision"])
+        for by_id, value in zip(rows, values):
+            previous = by_id.get(control_id)
+            if previous is None:
+                # No answer is added for a value that could not be computed;
+                # it would count as a pass in the rollups
+                if value is not None:
+                    by_id[control_id] = _answer(control, value, None)
+            elif previous["value"] != value:
+                by_id[control_id] = _answer(control, value, previous)
+    _apply_results(form, rows)
+
+
+def derive_answers(form: CompiledForm, answers: List[dict]) -> List[dict]:
+    """Canonical answers with Calculate values and rule-based results filled in by the server"""
+    if not form.calculations and not form.has_result_rules:
+        return answers
+    by_id = {answer["id"]: answer for answer in answers}
+    derive_columns(form, [by_id])
+    return list(by_id.values())
+
+
+def _net_deltas(document_id: int, before: List[list], after: List[list]) -> rollups.Deltas:
+    deltas: rollups.Deltas = {}
+    for answers in after:
+        rollups.count_answers(deltas, document_id, answers)
+    removed: rollups.Deltas = {}
+    for answers in before:
+        rollups.count_answers(removed, document_id, answers)
+    for key, delta in removed.items():
+        target = deltas.setdefault(key, {**delta, "pass_count": 0, "warning_count": 0, "fail_count": 0})
+        for column in rollups.RESULT_COLUMNS.values():
+            target[column] -= delta[column]
+    return deltas
+
+
+def recompute_document(
+    db: Session,
+    document_id: int,
+    batch_size: int = RECOMPUTE_BATCH_SIZE,
+    progress=None,
+) -> Dict[str, int]:
+    """Re-derive Calculate values and results of every submission of a document.
+
+    Uses the compiled form of the document's current version and commits one
+    batch at a time, adjusting the control rollups by the net change of each
+    batch. Returns the number of submissions scanned and updated.
+    """
+    version = db.execute(select(Document.version).where(Document.id == document_id)).scalar_one_or_none()
+    if version is None:
+        raise ValueError(f"Document {document_id} not found")
+    form = load_form(db, document_id, version)
+    scanned = updated = 0
+    last_id = 0
+    while True:
+        batch = db.execute(
+            select(FormSubmission.id, FormSubmission.answers, FormSubmission.answers_version)
+            .where(FormSubmission.document_id == document_id, FormSubmission.id > last_id)
+            .order_by(FormSubmission.id)
+            .limit(batch_size)
+        ).all()
+        if not batch:
+            break
+        originals = [
+            row.answers if is_canonical(row.answers_version) else normalize_answers(row.answers)
+            for row in batch
+        ]
+        rows = [{answer["id"]: answer for answer in answers} for answers in originals]
+        derive_columns(form, rows)
+
+        changes = []
+        before = []
+        after = []
+        for row, original, by_id in zip(batch, originals, rows):
+            answers = list(by_id.values())
+            if answers != original or not is_canonical(row.answers_version):
+                changes.append({"id": row.id, "answers": answers, "answers_version": CURRENT_ANSWERS_VERSION})
+                before.append(original)
+                after.append(answers)
+        if changes:
+            db.execute(update(FormSubmission), changes)
+            rollups.add_counts(db, _net_deltas(document_id, before, after))
+        db.commit()
+
+        scanned += len(batch)
+        updated += len(changes)
+        last_id = batch[-1].id
+        if progress:
+            progress(scanned, updated)
+    return {"scanned": scanned, "updated": updated}
@@ -0,0 +1,356 @@
+import json
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from sqlalchemy import Text, cast, select, tuple_
+from sqlalchemy.orm import Session
+from app.models.database import DocumentRevision
+from app.services.formulas import Formula, FormulaError, compile_formula
+
+# Form components understood by the frontend renderer (components/forms)
+CONTROL_TYPES = (
+    "TextInput",
+    "NumberInput",
+    "Dropdown",
+    "RadioButtons",
+    "MultipleChoice",
+    "DateInput",
+    "TimeInput",
+    "Calculate",
+)
+
+FORM_SCHEMA_VERSION = 1
+
+_TAG = re.compile(r"<(" + "|".join(CONTROL_TYPES) + r")(?=[\s/>])")
+_OBJECT_KEY = re.compile(r"(['\"])?([a-zA-Z0-9_]+)(['\"])?:")
+_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+_TIME = re.compile(r"^\d{2}:\d{2}(:\d{2})?$")
+
+
+# ----------------------------------------------------------------------
+# MDX parsing (mirrors parseProps in frontend/src/components/editor/FormRenderer.tsx)
+# ----------------------------------------------------------------------
+
+def _prop_value(raw: str) -> Any:
+    trimmed = raw.strip()
+    try:
+        return json.loads(trimmed)
+    except ValueError:
+        pass
+    # Object-literal style values like {min: 1, max: 2}
+    if ":" in trimmed:
+        candidate = trimmed if trimmed.startswith("{") else "{" + trimmed + "}"
+        normalized = _OBJECT_KEY.sub(r'"\2":', candidate).replace("'", '"')
+        try:
+            return json.loads(normalized)
+        except ValueError:
+            pass
+    if trimmed == "true":
+        return True
+    if trimmed == "false":
+        return False
+    try:
+        return float(trimmed)
+    except ValueError:
+        return raw
+
+
+def _parse_tag(content: str, start: int) -> Tuple[Dict[str, Any], int]:
+    """Parse the props of a tag whose name ends at start; returns (props, index after the tag)"""
+    props: Dict[str, Any] = {}
+    idx = start
+    length = len(content)
+
+    def skip_spaces():
+        nonlocal idx
+        while idx < length and content[idx].isspace():
+            idx += 1
+
+    def read_name() -> str:
+        nonlocal idx
+        begin = idx
+        while idx < length and (content[idx].isalnum() or content[idx] == "_"):
+            idx += 1
+        return content[begin:idx]
+
+    while idx < length:
+        skip_spaces()
+        if content.startswith("/>", idx):
+            return props, idx + 2
+        if idx < length and content[idx] == ">":
+            return props, idx + 1
+        name = read_name()
+        if not name:
+            # Not a well-formed prop list; stop at the next closing bracket
+            end = content.find(">", idx)
+            return props, length if end < 0 else end + 1
+        skip_spaces()
+        if idx < length and content[idx] == "=":
+            idx += 1
+            skip_spaces()
+            if idx < length and content[idx] == '"':
+                end = content.find('"', idx + 1)
+                end = length if end < 0 else end
+                props[name] = _prop_value(content[idx + 1:end])
+                idx = end + 1
+            elif idx < length and content[idx] == "{":
+                depth = 0
+                begin = idx + 1
+                while idx < length:
+                    if content[idx] == "{":
+                        depth += 1
+                    elif content[idx] == "}":
+                        depth -= 1
+                        if depth == 0:
+                            break
+                    idx += 1
+                props[name] = _prop_value(content[begin:idx])
+                idx += 1
+            else:
+                props[name] = _prop_value(read_name())
+        else:
+            # Bare prop => boolean true
+            props[name] = True
+    return props, length
+
+
+def _range(value: Any) -> Optional[Dict[str, float]]:
+    if not isinstance(value, dict):
+        return None
+    try:
+        return {"min": float(value["min"]), "max": float(value["max"])}
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def _strings(value: Any) -> Optional[List[str]]:
+    if isinstance(value, list):
+        return [str(item) for item in value]
+    return None
+
+
+def parse_form_schema(content: str) -> Dict[str, Any]:
+    """Extract the form controls declared in MDX content.
+
+    Controls without an id (which the renderer refuses to show) and repeated
+    ids are reported under "errors" instead of being listed.
+    """
+    controls: List[Dict[str, Any]] = []
+    errors: List[str] = []
+    seen = set()
+    position = 0
+    while True:
+        match = _TAG.search(content, position)
+        if match is None:
+            break
+        control_type = match.group(1)
+        props, position = _parse_tag(content, match.end())
+        control_id = props.get("id")
+        if control_id is None or control_id is True:
+            errors.append(f"{control_type} at offset {match.start()} has no id")
+            continue
+        control_id = str(control_id)
+        if control_id in seen:
+            errors.append(f"Duplicate control id: {control_id}")
+            continue
+        seen.add(control_id)
+
+        control: Dict[str, Any] = {
+            "id": control_id,
+            "type": control_type,
+            "label": str(props.get("label") or control_id),
+            "required": props.get("required") is True,
+        }
+        options = _strings(props.get("options"))
+        if options is not None:
+            control["options"] = options
+        if "correct" in props:
+            control["correct"] = props["correct"]
+        for bound in ("pass", "warn"):
+            limits = _range(props.get(bound))
+            if limits is not None:
+                control[bound] = limits
+        if control_type == "Calculate":
+            control["expression"] = str(props.get("expression") or "")
+            precision = props.get("precision", 2)
+            control["precision"] = int(precision) if isinstance(precision, (int, float)) else 2
+            try:
+                compile_formula(control["expression"])
+            except FormulaError as e:
+                errors.append(f"{control_id}: {e}")
+        controls.append(control)
+    return {"schema_version": FORM_SCHEMA_VERSION, "controls": controls, "errors": errors}
+
+
+# ----------------------------------------------------------------------
+# Submission validation
+# ----------------------------------------------------------------------
+
+def _check_text(control, value) -> Optional[str]:
+    return None if isinstance(value, str) else "must be a string"
+
+
+def _check_number(control, value) -> Optional[str]:
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return "must be a number"
+    return None
+
+
+def _check_pattern(pattern, description):
+    def check(control, value) -> Optional[str]:
+        if not isinstance(value, str) or not pattern.match(value):
+            return f"must be {description}"
+        return None
+    return check
+
+
+def _check_choice(control, value) -> Optional[str]:
+    if not isinstance(value, str) or value not in control["_options"]:
+        return "must be one of the control's options"
+    return None
+
+
+def _check_choices(control, value) -> Optional[str]:
+    if not isinstance(value, list) or not all(
+        isinstance(item, str) and item in control["_options"] for item in value
+    ):
+        return "must be a list of the control's options"
+    return None
+
+
+VALUE_CHECKS: Dict[str, Callable[[dict, Any], Optional[str]]] = {
+    "TextInput": _check_text,
+    "NumberInput": _check_number,
+    "Calculate": _check_number,
+    "Dropdown": _check_choice,
+    "RadioButtons": _check_choice,
+    "MultipleChoice": _check_choices,
+    "DateInput": _check_pattern(_DATE, "a YYYY-MM-DD date"),
+    "TimeInput": _check_pattern(_TIME, "an HH:MM time"),
+}
+
+
+class CompiledForm:
+    """Lookup tables built once per schema so a submission validates in O(answers)"""
+
+    def __init__(self, schema: Dict[str, Any]):
+        self.schema = schema
+        self.controls: Dict[str, dict] = {}
+        for control in schema.get("controls", []):
+            compiled = dict(control)
+            compiled["_check"] = VALUE_CHECKS.get(control["type"], _check_text)
+            if "options" in control:
+                compiled["_options"] = frozenset(control["options"])
+            else:
+                compiled["_options"] = frozenset()
+            self.controls[control["id"]] = compiled
+        self.required = frozenset(
+            control_id for control_id, control in self.controls.items() if control["required"]
+        )
+        # Calculate controls in declaration order with their compiled formula (None if invalid)
+        self.calculations: List[Tuple[dict, Optional[Formula]]] = []
+        for control in self.controls.values():
+            if control["type"] != "Calculate":
+                continue
+            try:
+                formula = compile_formula(control["expression"])
+            except FormulaError:
+                formula = None
+            if formula is not None and control["id"] in formula.variables:
+                formula = None
+            self.calculations.append((control, formula))
+        self.has_result_rules = any(
+            "pass" in control or "warn" in control or "correct" in control
+            for control in self.controls.values()
+        )
+
+    def validate(self, answers: List[dict]) -> List[str]:
+        """Problems with canonical answers ({id, label, value, result} dicts); empty if valid.
+
+        Documents that declare no controls are not treated as forms, so their
+        answers are accepted as before.
+        """
+        if not self.controls:
+            return []
+        problems = []
+        seen = set()
+        for answer in answers:
+            control_id = answer["id"]
+            control = self.controls.get(control_id)
+            if control is None:
+                problems.append(f"{control_id}: not a control of this form")
+                continue
+            if control_id in seen:
+                problems.append(f"{control_id}: answered more than once")
+                continue
+            seen.add(control_id)
+            value = answer.get("value")
+            if value is None or value == "" or value == []:
+                if control["required"]:
+                    problems.append(f"{control_id}: is required")
+                continue
+            problem = control["_check"](control, value)
+            if problem:
+                problems.append(f"{control_id}: {problem}")
+        for control_id in self.required - seen:
+            problems.append(f"{control_id}: is required")
+        return problems
+
+
+class FormCache:
+    """LRU of compiled forms keyed by the stored schema's JSON text.
+
+    Keying on the schema itself rather than (document_id, version) keeps a
+    reused document id from picking up a deleted document's form.
+    """
+
+    def __init__(self, max_size: int = 1024):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, CompiledForm]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[CompiledForm]:
+        with self._lock:
+            form = self._entries.get(key)
+            if form is not None:
+                self._entries.move_to_end(key)
+            return form
+
+    def set(self, key: str, form: CompiledForm) -> None:
+        with self._lock:
+            self._entries[key] = form
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+form_cache = FormCache()
+
+
+def load_forms(db: Session, versions: Dict[int, int]) -> Dict[int, CompiledForm]:
+    """Compiled forms for {document_id: version}, read in one query and compiled on cache misses.
+
+    Schemas are stored with each revision when it is written (init_db.py
+    backfills older rows). Unknown documents or versions are left out.
+    """
+    if not versions:
+        return {}
+    stored = db.execute(
+        select(DocumentRevision.document_id, cast(DocumentRevision.form_schema, Text).label("schema")).where(
+            tuple_(DocumentRevision.document_id, DocumentRevision.version).in_(list(versions.items())),
+            DocumentRevision.form_schema.is_not(None),
+        )
+    ).all()
+    forms = {}
+    for row in stored:
+        form = form_cache.get(row.schema)
+        if form is None:
+            form = CompiledForm(json.loads(row.schema))
+            form_cache.set(row.schema, form)
+        forms[row.document_id] = form
+    return forms
+
+
+def load_form(db: Session, document_id: int, version: int) -> Optional[CompiledForm]:
+    return load_forms(db, {document_id: version}).get(document_id)
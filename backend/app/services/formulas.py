@@ -0,0 +1,222 @@
+import ast
+import math
+from decimal import ROUND_HALF_UP, Decimal
+from functools import lru_cache
+from typing import Callable, List, Optional, Sequence, Tuple
+
+
+class FormulaError(Exception):
+    """Raised for Calculate expressions outside the supported arithmetic subset"""
+
+
+def _div(a, b):
+    # JavaScript semantics: x / 0 is +-Infinity (NaN for 0 / 0) rather than an error
+    try:
+        return a / b
+    except ZeroDivisionError:
+        return math.nan if a == 0 or a != a else math.copysign(math.inf, a) * math.copysign(1, b)
+
+
+def _mod(a, b):
+    try:
+        return math.fmod(a, b)
+    except (ValueError, ZeroDivisionError):
+        return math.nan
+
+
+def _pow(a, b):
+    try:
+        result = a ** b
+    except OverflowError:
+        return math.inf
+    except ZeroDivisionError:
+        return math.inf
+    return math.nan if isinstance(result, complex) else result
+
+
+def _safe(fn):
+    def call(*args):
+        try:
+            return fn(*args)
+        except (TypeError, ValueError, OverflowError, ZeroDivisionError):
+            return math.nan
+    return call
+
+
+def _round(x):
+    # Math.round rounds halves towards +Infinity
+    return math.floor(x + 0.5) if math.isfinite(x) else x
+
+
+def _sign(x):
+    return x if x == 0 or x != x else math.copysign(1, x)
+
+
+# The Math members a Calculate expression may use (JavaScript names)
+MATH_FUNCTIONS = {
+    "abs": _safe(abs),
+    "ceil": _safe(math.ceil),
+    "floor": _safe(math.floor),
+    "round": _safe(_round),
+    "trunc": _safe(math.trunc),
+    "sign": _safe(_sign),
+    "sqrt": _safe(math.sqrt),
+    "cbrt": _safe(lambda x: math.copysign(abs(x) ** (1 / 3), x)),
+    "exp": _safe(math.exp),
+    "log": _safe(math.log),
+    "log10": _safe(math.log10),
+    "log2": _safe(math.log2),
+    "pow": _safe(_pow),
+    "min": _safe(min),
+    "max": _safe(max),
+    "hypot": _safe(math.hypot),
+    "sin": _safe(math.sin),
+    "cos": _safe(math.cos),
+    "tan": _safe(math.tan),
+    "asin": _safe(math.asin),
+    "acos": _safe(math.acos),
+    "atan": _safe(math.atan),
+    "atan2": _safe(math.atan2),
+}
+MATH_CONSTANTS = {"PI": math.pi, "E": math.e, "LN2": math.log(2), "LN10": math.log(10), "SQRT2": math.sqrt(2)}
+
+_NAMESPACE = {
+    "__builtins__": {},
+    "__zip": zip,
+    "__div": _div,
+    "__mod": _mod,
+    "__pow": _pow,
+    **{f"__math_{name}": fn for name, fn in MATH_FUNCTIONS.items()},
+    **{f"__math_{name}": value for name, value in MATH_CONSTANTS.items()},
+}
+_BINARY = {ast.Div: "__div", ast.Mod: "__mod", ast.Pow: "__pow"}
+
+
+class _Rewriter(ast.NodeTransformer):
+    """Check an expression against the allowed subset and route JS semantics through helpers"""
+
+    def __init__(self):
+        self.variables: List[str] = []
+
+    def generic_visit(self, node):
+        raise FormulaError(f"Unsupported syntax: {type(node).__name__}")
+
+    def visit_Expression(self, node):
+        node.body = self.visit(node.body)
+        return node
+
+    def visit_Constant(self, node):
+        if isinstance(node.value, bool) or not isinstance(node.value, (int, float)):
+            raise FormulaError(f"Unsupported constant: {node.value!r}")
+        # Numbers are doubles in JavaScript; this also keeps 10 ** 1000 from building a huge int
+        node.value = float(node.value)
+        return node
+
+    def visit_Name(self, node):
+        if node.id == "Math" or node.id.startswith("__"):
+            raise FormulaError(f"Unsupported name: {node.id}")
+        if node.id not in self.variables:
+            self.variables.append(node.id)
+        return node
+
+    def _math(self, node) -> str:
+        if not (isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name) and node.value.id == "Math"):
+            raise FormulaError("Only Math members can be called")
+        return node.attr
+
+    def visit_Attribute(self, node):
+        name = self._math(node)
+        if name not in MATH_CONSTANTS:
+            raise FormulaError(f"Unsupported Math constant: {name}")
+        return ast.copy_location(ast.Name(id=f"__math_{name}", ctx=ast.Load()), node)
+
+    def visit_Call(self, node):
+        name = self._math(node.func)
+        if name not in MATH_FUNCTIONS:
+            raise FormulaError(f"Unsupported Math function: {name}")
+        if node.keywords:
+            raise FormulaError(f"Keyword arguments are not supported: Math.{name}")
+        node.func = ast.copy_location(ast.Name(id=f"__math_{name}", ctx=ast.Load()), node.func)
+        node.args = [self.visit(arg) for arg in node.args]
+        return node
+
+    def visit_UnaryOp(self, node):
+        if not isinstance(node.op, (ast.UAdd, ast.USub)):
+            raise FormulaError(f"Unsupported operator: {type(node.op).__name__}")
+        node.operand = self.visit(node.operand)
+        return node
+
+    def visit_BinOp(self, node):
+        if not isinstance(node.op, (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Mod, ast.Pow)):
+            raise FormulaError(f"Unsupported operator: {type(node.op).__name__}")
+        left = self.visit(node.left)
+        right = self.visit(node.right)
+        helper = _BINARY.get(type(node.op))
+        if helper is None:
+            node.left, node.right = left, right
+            return node
+        return ast.copy_location(
+            ast.Call(func=ast.Name(id=helper, ctx=ast.Load()), args=[left, right], keywords=[]), node
+        )
+
+
+class Formula:
+    """A compiled Calculate expression.
+
+    ``variables`` lists the answer ids it reads, in order. ``evaluate`` takes
+    one value per variable. ``evaluate_columns`` takes one sequence per
+    variable and runs the whole batch in a single compiled comprehension.
+    """
+
+    def __init__(self, expression: str, variables: Tuple[str, ...], scalar: Callable, columns: Callable):
+        self.expression = expression
+        self.variables = variables
+        self._scalar = scalar
+        self._columns = columns
+
+    def evaluate(self, *values: float) -> float:
+        return self._scalar(*values)
+
+    def evaluate_columns(self, columns: Sequence[Sequence[float]], rows: int) -> List[float]:
+        if not self.variables:
+            # A constant expression still yields one result per row
+            return [self._scalar()] * rows
+        return self._columns(*columns)
+
+
+@lru_cache(maxsize=1024)
+def compile_formula(expression: str) -> Formula:
+    """Parse a Calculate expression (JavaScript arithmetic with Math.*) once into Python code"""
+    try:
+        tree = ast.parse(expression.strip(), mode="eval")
+    except SyntaxError as e:
+        raise FormulaError(f"Invalid expression: {e.msg}")
+    rewriter = _Rewriter()
+    tree = ast.fix_missing_locations(rewriter.visit(tree))
+    variables = tuple(rewriter.variables)
+    body = ast.unparse(tree)
+    params = ", ".join(variables)
+    scalar = eval(f"lambda {params}: {body}", _NAMESPACE)
+    if variables:
+        columns = eval(
+            f"lambda {params}: [{body} for {params}{',' if len(variables) == 1 else ''} in __zip({params})]",
+            _NAMESPACE,
+        )
+    else:
+        columns = None
+    return Formula(expression, variables, scalar, columns)
+
+
+def to_fixed(value: float, precision: int) -> float:
+    """Round like the frontend: integers as-is, otherwise parseFloat(value.toFixed(precision))"""
+    if float(value).is_integer():
+        return value
+    quantum = Decimal(1).scaleb(-precision)
+    return float(Decimal(value).quantize(quantum, rounding=ROUND_HALF_UP))
+
+
+def finish(value, precision: int) -> Optional[float]:
+    """NaN and infinite results count as no result, as in the browser"""
+    if value is None or not math.isfinite(value):
+        return None
+    return to_fixed(value, precision)
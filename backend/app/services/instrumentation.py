@@ -0,0 +1,95 @@
+import os
+import sys
+import time
+from contextvars import ContextVar
+from typing import Callable, List, Optional, Tuple
+import greenlet
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+
+class RequestStats:
+    """SQL work attributed to the current request.
+
+    ``queries`` stays None unless a caller opts in to recording each
+    statement together with the application code that issued it.
+    """
+
+    __slots__ = ("statements", "sql_seconds", "queries")
+
+    def __init__(self):
+        self.statements = 0
+        self.sql_seconds = 0.0
+        self.queries: Optional[List[Tuple[str, str]]] = None
+
+
+current_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("current_request_stats", default=None)
+
+# Called with the seconds spent acquiring a pooled connection
+checkout_observers: List[Callable[[float], None]] = []
+
+
+class InstrumentedAsyncQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that reports how long each connection checkout waited"""
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            elapsed = time.perf_counter() - start
+            for observer in checkout_observers:
+                observer(elapsed)
+
+
+_APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) + os.sep
+_ROOT_DIR = os.path.dirname(os.path.dirname(_APP_DIR))
+
+
+def call_site(*ignore: str) -> str:
+    """file:line of the innermost application frame outside this module (and ignore).
+
+    The async engine runs the DBAPI call in a child greenlet, so the walk
+    continues into the parent greenlet to reach the awaiting route code.
+    """
+    frame = sys._getframe(1)
+    current = greenlet.getcurrent()
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(_APP_DIR) and filename != __file__ and filename not in ignore:
+            return f"{os.path.relpath(filename, _ROOT_DIR)}:{frame.f_lineno} in {frame.f_code.co_name}"
+        frame = frame.f_back
+        if frame is None and current.parent is not None:
+            current = current.parent
+            frame = current.gr_frame
+    return "<unknown>"
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = conn.info["query_start"].pop()
+    stats = current_request_stats.get()
+    if stats is not None:
+        stats.statements += 1
+        stats.sql_seconds += time.perf_counter() - start
+        if stats.queries is not None:
+            stats.queries.append((statement, call_site()))
+
+
+def _handle_error(exception_context):
+    starts = exception_context.connection.info.get("query_start") if exception_context.connection else None
+    if starts:
+        starts.pop()
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Attribute every statement run on engine to the current request's RequestStats"""
+    if event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
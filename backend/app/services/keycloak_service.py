@@ -1,52 +1,285 @@
+import asyncio
 import os
-from typing import Dict, Any
-from jose import jwt, JWTError
+import threading
+import time
+from typing import Dict, Any, Optional
+from jose import jwk, jwt, JWTError
+import httpx
 import requests
 
 
 class KeycloakService:
-    def __init__(self):
-        self.keycloak_url = os.getenv("KEYCLOAK_URL", "http://localhost:8080")
-        self.realm = os.getenv("KEYCLOAK_REALM", "docuforms")
-        self.client_id = os.getenv("KEYCLOAK_CLIENT_ID", "docuforms-client")
+    """Verifies Keycloak access tokens against a cached copy of the realm's OIDC metadata.
+
+    The discovery document and JWKS are fetched once and kept for ``cache_ttl``
+    seconds. Once an entry is past ``refresh_after`` seconds it is refreshed on a
+    background thread while the cached copy keeps serving requests, and a token
+    signed with an unknown ``kid`` triggers a (rate limited) refresh so key
+    rotation is picked up without a restart. Signature and expiry checks run
+    locally, so a normal request needs no network round-trip.
+
+    ``adecode_token`` is the event-loop friendly variant used by the API: it
+    fetches through a pooled ``httpx.AsyncClient`` and merges concurrent
+    refreshes into a single in-flight request that every waiter shares.
+    """
+
+    ALGORITHMS = ["RS256"]
+
+    def __init__(
+        self,
+        keycloak_url: Optional[str] = None,
+        realm: Optional[str] = None,
+        client_id: Optional[str] = None,
+        cache_ttl: Optional[float] = None,
+        async_client: Optional[httpx.AsyncClient] = None,
+    ):
+        self.keycloak_url = keycloak_url or os.getenv("KEYCLOAK_URL", "http://localhost:8080")
+        self.realm = realm or os.getenv("KEYCLOAK_REALM", "docuforms")
+        self.client_id = client_id or os.getenv("KEYCLOAK_CLIENT_ID", "docuforms-client")
         self.realm_url = f"{self.keycloak_url}/realms/{self.realm}"
 
-    def get_public_key(self) -> str:
-        """Get the public key for token verification"""
+        self.cache_ttl = cache_ttl if cache_ttl is not None else float(os.getenv("KEYCLOAK_CACHE_TTL", "3600"))
+        # Start refreshing in the background once an entry is this old
+        self.refresh_after = self.cache_ttl * 0.8
+        # Minimum spacing between refreshes forced by an unknown kid
+        self.min_refresh_interval = float(os.getenv("KEYCLOAK_MIN_REFRESH_INTERVAL", "10"))
+        self.http_timeout = float(os.getenv("KEYCLOAK_HTTP_TIMEOUT", "5"))
+        self.leeway = int(os.getenv("KEYCLOAK_CLOCK_LEEWAY", "30"))
+
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._discovery: Optional[Dict[str, Any]] = None
+        self._jwks: Optional[Dict[str, Any]] = None
+        self._keys: Dict[str, Any] = {}
+        self._fetched_at = 0.0
+        self._last_forced_refresh = 0.0
+
+        # Created on first use unless given (e.g. one with a stub transport in tests)
+        self._async_client: Optional[httpx.AsyncClient] = async_client
+        self._inflight: Optional[asyncio.Task] = None
+
+    # ------------------------------------------------------------------
+    # Cache state
+    # ------------------------------------------------------------------
+
+    def _age(self) -> float:
+        return time.monotonic() - self._fetched_at
+
+    def _is_fresh(self) -> bool:
+        return self._jwks is not None and self._age() < self.cache_ttl
+
+    def _store(self, discovery: Dict[str, Any], jwks: Dict[str, Any]) -> None:
+        """Parse the fetched metadata and swap it in as the current cache entry."""
+        keys = {}
+        for key_data in jwks.get("keys", []):
+            if key_data.get("use", "sig") != "sig" or key_data.get("kty") != "RSA":
+                continue
+            try:
+                keys[key_data.get("kid")] = jwk.construct(key_data, key_data.get("alg", "RS256"))
+            except Exception:
+                continue
+        with self._lock:
+            self._discovery = discovery
+            self._jwks = jwks
+            self._keys = keys
+            self._fetched_at = time.monotonic()
+
+    def _fetch(self) -> None:
+        """Fetch the discovery document and JWKS from Keycloak."""
+        try:
+            response = requests.get(
+                f"{self.realm_url}/.well-known/openid-configuration", timeout=self.http_timeout
+            )
+            response.raise_for_status()
+            discovery = response.json()
+            jwks_response = requests.get(discovery["jwks_uri"], timeout=self.http_timeout)
+            jwks_response.raise_for_status()
+            self._store(discovery, jwks_response.json())
+        except Exception as e:
+            raise Exception(f"Failed to fetch OIDC metadata: {str(e)}")
+
+    def _background_refresh(self) -> None:
+        try:
+            self._fetch()
+        except Exception:
+            # Keep serving the cached copy; the next request past refresh_after retries
+            pass
+        finally:
+            self._refreshing = False
+
+    def _maybe_refresh_in_background(self) -> None:
+        if self._age() < self.refresh_after:
+            return
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(target=self._background_refresh, daemon=True).start()
+
+    def _ensure_metadata(self) -> None:
+        if self._is_fresh():
+            self._maybe_refresh_in_background()
+            return
+        self._fetch()
+
+    def _get_signing_key(self, kid: Optional[str]):
+        """Return the cached key for kid, refreshing once if it is not known yet."""
+        key = self._keys.get(kid)
+        if key is not None:
+            return key
+        now = time.monotonic()
+        if now - self._last_forced_refresh >= self.min_refresh_interval:
+            self._last_forced_refresh = now
+            self._fetch()
+            key = self._keys.get(kid)
+        if key is None:
+            raise Exception(f"Unknown signing key: {kid}")
+        return key
+
+    def refresh(self) -> None:
+        """Force a refresh of the cached discovery document and JWKS."""
+        self._fetch()
+
+    # ------------------------------------------------------------------
+    # Async fetching
+    # ------------------------------------------------------------------
+
+    def _get_async_client(self) -> httpx.AsyncClient:
+        if self._async_client is None:
+            self._async_client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.http_timeout),
+                limits=httpx.Limits(max_connections=10, max_keepalive_connections=5),
+            )
+        return self._async_client
+
+    async def _afetch_once(self) -> None:
         try:
-            response = requests.get(f"{self.realm_url}/.well-known/openid-configuration")
-            jwks_uri = response.json()["jwks_uri"]
-            jwks_response = requests.get(jwks_uri)
-            jwks = jwks_response.json()
-            # In production, you'd use the jwks to verify the token properly
-            # For now, we'll use a simpler approach
-            return jwks
+            client = self._get_async_client()
+            response = await client.get(f"{self.realm_url}/.well-known/openid-configuration")
+            response.raise_for_status()
+            discovery = response.json()
+            jwks_response = await client.get(discovery["jwks_uri"])
+            jwks_response.raise_for_status()
+            self._store(discovery, jwks_response.json())
+        except Exception as e:
+            raise Exception(f"Failed to fetch OIDC metadata: {str(e)}")
+
+    def _clear_inflight(self, task: asyncio.Task) -> None:
+        if self._inflight is task:
+            self._inflight = None
+        # Mark the exception as retrieved for background refreshes nobody awaited
+        if not task.cancelled():
+            task.exception()
+
+    def _start_afetch(self) -> asyncio.Task:
+        """Return the in-flight fetch, starting one if none is running."""
+        if self._inflight is None:
+            self._inflight = asyncio.ensure_future(self._afetch_once())
+            self._inflight.add_done_callback(self._clear_inflight)
+        return self._inflight
+
+    async def _afetch(self) -> None:
+        # Shield so a cancelled request does not cancel the fetch other waiters share
+        await asyncio.shield(self._start_afetch())
+
+    async def _aensure_metadata(self) -> None:
+        if self._is_fresh():
+            if self._age() >= self.refresh_after:
+                self._start_afetch()
+            return
+        await self._afetch()
+
+    async def _aget_signing_key(self, kid: Optional[str]):
+        key = self._keys.get(kid)
+        if key is not None:
+            return key
+        now = time.monotonic()
+        if self._inflight is not None:
+            await self._afetch()
+        elif now - self._last_forced_refresh >= self.min_refresh_interval:
+            self._last_forced_refresh = now
+            await self._afetch()
+        key = self._keys.get(kid)
+        if key is None:
+            raise Exception(f"Unknown signing key: {kid}")
+        return key
+
+    async def aclose(self) -> None:
+        """Close the pooled async HTTP client."""
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def get_discovery(self) -> Dict[str, Any]:
+        """Get the realm's OpenID Connect discovery document"""
+        self._ensure_metadata()
+        return self._discovery
+
+    def get_public_key(self) -> Dict[str, Any]:
+        """Get the JWKS used for token verification"""
+        try:
+            self._ensure_metadata()
+            return self._jwks
         except Exception as e:
             raise Exception(f"Failed to get public key: {str(e)}")
 
-    def verify_token(self, token: str) -> Dict[str, Any]:
-        """Verify and decode JWT token"""
+    def _token_header(self, token: str) -> Dict[str, Any]:
+        header = jwt.get_unverified_header(token)
+        if header.get("alg") not in self.ALGORITHMS:
+            raise Exception(f"Unsupported token algorithm: {header.get('alg')}")
+        return header
+
+    def _decode(self, token: str, key) -> Dict[str, Any]:
+        return jwt.decode(
+            token,
+            key,
+            algorithms=self.ALGORITHMS,
+            issuer=self._discovery["issuer"],
+            options={"verify_aud": False, "leeway": self.leeway},
+        )
+
+    def decode_token(self, token: str) -> Dict[str, Any]:
+        """Verify the token's signature, issuer and expiry and return its claims"""
         try:
-            # Get public key configuration
-            response = requests.get(f"{self.realm_url}/.well-known/openid-configuration")
-            issuer = response.json()["issuer"]
-
-            # Decode token (without verification for now - in production, verify properly)
-            # For production, use proper JWT verification with the public key
-            unverified = jwt.get_unverified_claims(token)
-
-            # Basic validation
-            if unverified.get("iss") != issuer:
-                raise Exception("Invalid token issuer")
-
-            return {
-                "id": unverified.get("sub"),
-                "username": unverified.get("preferred_username"),
-                "email": unverified.get("email"),
-                "groups": unverified.get("groups", []),
-            }
+            self._ensure_metadata()
+            header = self._token_header(token)
+            key = self._get_signing_key(header.get("kid"))
+            return self._decode(token, key)
         except JWTError as e:
             raise Exception(f"Invalid token: {str(e)}")
         except Exception as e:
             raise Exception(f"Token verification failed: {str(e)}")
 
+    async def adecode_token(self, token: str) -> Dict[str, Any]:
+        """Async variant of decode_token that never blocks the event loop on I/O"""
+        try:
+            await self._aensure_metadata()
+            header = self._token_header(token)
+            key = await self._aget_signing_key(header.get("kid"))
+            return self._decode(token, key)
+        except JWTError as e:
+            raise Exception(f"Invalid token: {str(e)}")
+        except Exception as e:
+            raise Exception(f"Token verification failed: {str(e)}")
+
+    @staticmethod
+    def user_from_claims(claims: Dict[str, Any]) -> Dict[str, Any]:
+        """Map verified token claims to the user dict used by the API"""
+        return {
+            "id": claims.get("sub"),
+            "username": claims.get("preferred_username"),
+            "email": claims.get("email"),
+            "groups": claims.get("groups", []),
+        }
+
+    def verify_token(self, token: str) -> Dict[str, Any]:
+        """Verify and decode JWT token"""
+        return self.user_from_claims(self.decode_token(token))
+
+    async def averify_token(self, token: str) -> Dict[str, Any]:
+        """Async variant of verify_token"""
+        return self.user_from_claims(await self.adecode_token(token))
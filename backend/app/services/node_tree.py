@@ -0,0 +1,165 @@
+from typing import List, Optional
+from sqlalchemy import delete, func, insert, literal, select, true
+from sqlalchemy.orm import Session, aliased
+from app.models.database import Document, TreeNode, TreeNodeClosure
+
+Closure = TreeNodeClosure.__table__
+
+
+def add_node(db: Session, node_id: int, parent_id: Optional[int]) -> None:
+    """Insert closure rows for a freshly created node (its self row plus one per ancestor)"""
+    rows = select(literal(node_id), literal(node_id), literal(0))
+    if parent_id is not None:
+        rows = rows.union_all(
+            select(Closure.c.ancestor_id, literal(node_id), Closure.c.depth + 1).where(
+                Closure.c.descendant_id == parent_id
+            )
+        )
+    db.execute(
+        insert(Closure).from_select(["ancestor_id", "descendant_id", "depth"], rows)
+    )
+
+
+def is_descendant(db: Session, node_id: int, ancestor_id: int) -> bool:
+    """True if node_id is ancestor_id or lies anywhere below it"""
+    return db.execute(
+        select(Closure.c.depth).where(
+            Closure.c.ancestor_id == ancestor_id, Closure.c.descendant_id == node_id
+        )
+    ).first() is not None
+
+
+def _unlink_from_ancestors(db: Session, node_id: int, include_self: bool) -> None:
+    """Delete the paths joining the subtree of node_id to the nodes above it"""
+    subtree = select(Closure.c.descendant_id).where(Closure.c.ancestor_id == node_id)
+    above = select(Closure.c.ancestor_id).where(Closure.c.descendant_id == node_id)
+    if not include_self:
+        above = above.where(Closure.c.ancestor_id != node_id)
+    db.execute(
+        delete(Closure).where(
+            Closure.c.descendant_id.in_(subtree.scalar_subquery()),
+            Closure.c.ancestor_id.in_(above.scalar_subquery()),
+        )
+    )
+
+
+def move_node(db: Session, node_id: int, new_parent_id: Optional[int]) -> None:
+    """Re-link the subtree of node_id under new_parent_id.
+
+    Callers must reject moves under the node's own subtree first (see is_descendant).
+    """
+    _unlink_from_ancestors(db, node_id, include_self=False)
+    if new_parent_id is not None:
+        link_subtree(db, node_id, new_parent_id)
+
+
+def link_subtree(db: Session, node_id: int, parent_id: int) -> None:
+    """Add the paths from parent_id and its ancestors to every node of a detached subtree"""
+    above = aliased(Closure)
+    below = aliased(Closure)
+    db.execute(
+        insert(Closure).from_select(
+            ["ancestor_id", "descendant_id", "depth"],
+            select(above.c.ancestor_id, below.c.descendant_id, above.c.depth + below.c.depth + 1)
+            .select_from(above)
+            .join(below, true())
+            .where(above.c.descendant_id == parent_id, below.c.ancestor_id == node_id),
+        )
+    )
+
+
+def rebuild_closure(db: Session) -> int:
+    """Recompute the closure table from parent_id; returns the number of rows written"""
+    db.execute(delete(Closure))
+    db.execute(
+        insert(Closure).from_select(
+            ["ancestor_id", "descendant_id", "depth"],
+            select(TreeNode.id, TreeNode.id, literal(0)),
+        )
+    )
+    total = db.execute(select(func.count()).select_from(Closure)).scalar_one()
+    depth = 0
+    # One set-based insert per level; a cycle in parent_id stops after total levels
+    while depth < total:
+        result = db.execute(
+            insert(Closure).from_select(
+                ["ancestor_id", "descendant_id", "depth"],
+                select(Closure.c.ancestor_id, TreeNode.id, Closure.c.depth + 1)
+                .join(TreeNode, TreeNode.parent_id == Closure.c.descendant_id)
+                .where(Closure.c.depth == depth),
+            )
+        )
+        if not result.rowcount:
+            break
+        depth += 1
+    return db.execute(select(func.count()).select_from(Closure)).scalar_one()
+
+
+def subtree_nodes(db: Session, node_id: Optional[int], depth: Optional[int] = None) -> List[TreeNode]:
+    """Fetch node_id (or every root if None) and its descendants up to depth levels below it"""
+    query = db.query(TreeNode).join(Closure, Closure.c.descendant_id == TreeNode.id)
+    if node_id is None:
+        roots = select(TreeNode.id).where(TreeNode.parent_id.is_(None), TreeNode.deleted_at.is_(None))
+        query = query.filter(Closure.c.ancestor_id.in_(roots))
+    else:
+        query = query.filter(Closure.c.ancestor_id == node_id)
+    if depth is not None:
+        query = query.filter(Closure.c.depth <= depth)
+    return query.order_by(TreeNode.id).all()
+
+
+def ancestor_nodes(db: Session, node_id: int) -> List[TreeNode]:
+    """Fetch the ancestors of node_id ordered from the root down (breadcrumbs)"""
+    return (
+        db.query(TreeNode)
+        .join(Closure, Closure.c.ancestor_id == TreeNode.id)
+        .filter(Closure.c.descendant_id == node_id, Closure.c.depth > 0)
+        .order_by(Closure.c.depth.desc())
+        .all()
+    )
+
+
+def subtree_ids(node_id: int):
+    """Select statement yielding the ids of node_id and all of its descendants"""
+    return select(Closure.c.descendant_id).where(Closure.c.ancestor_id == node_id)
+
+
+def hidden_ids():
+    """Select statement yielding the ids of every node inside a subtree queued for purging"""
+    return (
+        select(Closure.c.descendant_id)
+        .join(TreeNode, TreeNode.id == Closure.c.ancestor_id)
+        .where(TreeNode.deleted_at.is_not(None))
+    )
+
+
+def hidden_document_ids():
+    """Select statement yielding the ids of documents inside a subtree queued for purging"""
+    return select(Document.id).where(Document.node_id.in_(hidden_ids()))
+
+
+def is_hidden(db: Session, node_id: int) -> bool:
+    """True if node_id or one of its ancestors is queued for purging"""
+    return db.execute(hidden_ids().where(Closure.c.descendant_id == node_id).limit(1)).first() is not None
+
+
+def is_document_hidden(db: Session, document_id: int) -> bool:
+    """True if document_id lies in a subtree queued for purging"""
+    return db.execute(hidden_document_ids().where(Document.id == document_id).limit(1)).first() is not None
+
+
+def subtree_counts(db: Session, node_id: int) -> dict:
+    """Count the nodes and documents below node_id"""
+    descendant_count = db.execute(
+        select(func.count()).select_from(Closure).where(
+            Closure.c.ancestor_id == node_id, Closure.c.depth > 0
+        )
+    ).scalar_one()
+    document_count = db.execute(
+        select(func.count(Document.id)).where(Document.node_id.in_(subtree_ids(node_id)))
+    ).scalar_one()
+    return {
+        "node_id": node_id,
+        "descendant_count": descendant_count,
+        "document_count": document_count,
+    }
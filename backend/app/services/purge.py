@@ -0,0 +1,178 @@
+import asyncio
+import logging
+import os
+from datetime import datetime
+from typing import Callable, Dict, Optional
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.orm import Session
+from app.models.database import AsyncSessionLocal, Document, FormSubmission, PurgeJob, TreeNode
+from app.services import node_tree
+from app.services.node_tree import Closure
+from app.services.tree_cache import bump_tree_version
+
+logger = logging.getLogger(__name__)
+
+# Subtrees with more rows than this (nodes + documents + submissions) are
+# hidden at once and deleted by a background job instead of in the request
+PURGE_SYNC_LIMIT = int(os.getenv("PURGE_SYNC_LIMIT", "10000"))
+PURGE_BATCH_SIZE = int(os.getenv("PURGE_BATCH_SIZE", "5000"))
+
+Counts = Dict[str, int]
+
+
+def _subtree_documents(node_id: int):
+    return select(Document.id).where(Document.node_id.in_(node_tree.subtree_ids(node_id)))
+
+
+def _subtree_submissions(node_id: int):
+    return select(FormSubmission.id).where(FormSubmission.document_id.in_(_subtree_documents(node_id)))
+
+
+def _count(db: Session, ids, limit: Optional[int] = None) -> int:
+    if limit is not None:
+        ids = ids.limit(limit + 1)
+    return db.execute(select(func.count()).select_from(ids.subquery())).scalar_one()
+
+
+def subtree_size(db: Session, node_id: int, limit: Optional[int] = None) -> Counts:
+    """Rows a purge of node_id deletes; with limit, counting stops once the total passes it"""
+    counts = {"nodes": 0, "documents": 0, "submissions": 0}
+    total = 0
+    for key, ids in (
+        ("nodes", node_tree.subtree_ids(node_id)),
+        ("documents", _subtree_documents(node_id)),
+        ("submissions", _subtree_submissions(node_id)),
+    ):
+        if limit is not None and total > limit:
+            break
+        counts[key] = _count(db, ids, None if limit is None else limit - total)
+        total += counts[key]
+    return counts
+
+
+def purge_batch(db: Session, node_id: int, batch_size: int) -> Counts:
+    """Delete up to batch_size rows of a subtree, leaves first; the caller commits.
+
+    Submissions go first, then documents (their revisions and rollups
+    cascade), then nodes from the deepest level up (closure rows cascade),
+    so every batch leaves consistent data behind. Returns the rows deleted;
+    all zero once the subtree is gone.
+    """
+    deleted = {"nodes": 0, "documents": 0, "submissions": 0}
+    submissions = _subtree_submissions(node_id).limit(batch_size).scalar_subquery()
+    deleted["submissions"] = db.execute(
+        delete(FormSubmission).where(FormSubmission.id.in_(submissions))
+    ).rowcount
+    if deleted["submissions"]:
+        return deleted
+
+    documents = _subtree_documents(node_id).limit(batch_size).scalar_subquery()
+    deleted["documents"] = db.execute(delete(Document).where(Document.id.in_(documents))).rowcount
+    if deleted["documents"]:
+        return deleted
+
+    nodes = list(
+        db.scalars(
+            node_tree.subtree_ids(node_id).order_by(Closure.c.depth.desc()).limit(batch_size)
+        )
+    )
+    if nodes:
+        # Deepest first, so the batch holds every descendant of its nodes; the
+        # rowcount would miss rows SQLite removes through the parent_id cascade
+        db.execute(delete(TreeNode).where(TreeNode.id.in_(nodes)))
+        deleted["nodes"] = len(nodes)
+    return deleted
+
+
+def purge_subtree(
+    db: Session,
+    node_id: int,
+    batch_size: Optional[int] = None,
+    progress: Optional[Callable[[Counts], None]] = None,
+) -> Counts:
+    """Delete node_id and everything below it.
+
+    Without batch_size everything goes in one transaction left to the
+    caller; with it each batch is committed and reported to progress.
+    """
+    total = {"nodes": 0, "documents": 0, "submissions": 0}
+    while True:
+        deleted = purge_batch(db, node_id, batch_size or PURGE_BATCH_SIZE)
+        if not any(deleted.values()):
+            return total
+        for key, count in deleted.items():
+            total[key] += count
+        if batch_size:
+            if progress:
+                progress(deleted)
+            db.commit()
+
+
+def hide_subtree(db: Session, node_id: int) -> PurgeJob:
+    """Detach node_id from the tree, mark it deleted and queue a purge job; the caller commits"""
+    size = subtree_size(db, node_id)
+    node_tree.move_node(db, node_id, None)
+    db.execute(
+        update(TreeNode).where(TreeNode.id == node_id).values(parent_id=None, deleted_at=datetime.utcnow())
+    )
+    bump_tree_version(db)
+    job = PurgeJob(
+        node_id=node_id,
+        status="pending",
+        total_nodes=size["nodes"],
+        total_documents=size["documents"],
+        total_submissions=size["submissions"],
+    )
+    db.add(job)
+    db.flush()
+    return job
+
+
+def _record_progress(db: Session, job_id: int, deleted: Counts) -> None:
+    db.execute(
+        update(PurgeJob)
+        .where(PurgeJob.id == job_id)
+        .values(
+            status="running",
+            deleted_nodes=PurgeJob.deleted_nodes + deleted["nodes"],
+            deleted_documents=PurgeJob.deleted_documents + deleted["documents"],
+            deleted_submissions=PurgeJob.deleted_submissions + deleted["submissions"],
+        )
+    )
+
+
+def run_job(db: Session, job_id: int, batch_size: int = PURGE_BATCH_SIZE) -> None:
+    """Run (or resume) a purge job, committing progress with every batch"""
+    job = db.get(PurgeJob, job_id)
+    if job is None or job.status == "done":
+        return
+    node_id = job.node_id
+    try:
+        purge_subtree(db, node_id, batch_size, lambda deleted: _record_progress(db, job_id, deleted))
+        db.execute(update(PurgeJob).where(PurgeJob.id == job_id).values(status="done"))
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.exception("Purge job %s failed", job_id)
+        db.execute(update(PurgeJob).where(PurgeJob.id == job_id).values(status="failed", error=str(e)))
+        db.commit()
+
+
+def unfinished_jobs(db: Session):
+    return list(db.scalars(select(PurgeJob.id).where(PurgeJob.status != "done").order_by(PurgeJob.id)))
+
+
+# Keeps running jobs referenced until they finish
+_tasks = set()
+
+
+async def _run_in_background(job_id: int) -> None:
+    async with AsyncSessionLocal() as db:
+        await db.run_sync(run_job, job_id)
+
+
+def start_job(job_id: int) -> None:
+    """Run a purge job on this worker's event loop after the request that queued it"""
+    task = asyncio.get_running_loop().create_task(_run_in_background(job_id))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
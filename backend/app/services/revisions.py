@@ -0,0 +1,156 @@
+import difflib
+import json
+import os
+from typing import List, Optional, Tuple
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+from app.models.database import DocumentRevision
+from app.services.form_schema import parse_form_schema
+
+SNAPSHOT = "snapshot"
+DELTA = "delta"
+
+# Every Nth version stores the full content, bounding reconstruction to N-1 deltas
+SNAPSHOT_INTERVAL = int(os.getenv("REVISION_SNAPSHOT_INTERVAL", "20"))
+
+
+def make_delta(old: str, new: str) -> str:
+    """Encode new as line edits against old: JSON [[start, end, [lines...]], ...]"""
+    old_lines = old.splitlines(keepends=True)
+    new_lines = new.splitlines(keepends=True)
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    ops = [
+        [i1, i2, new_lines[j1:j2]]
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes()
+        if tag != "equal"
+    ]
+    return json.dumps(ops, separators=(",", ":"))
+
+
+def apply_delta(old: str, delta: str) -> str:
+    """Inverse of make_delta"""
+    old_lines = old.splitlines(keepends=True)
+    parts = []
+    position = 0
+    for start, end, lines in json.loads(delta):
+        parts.extend(old_lines[position:start])
+        parts.extend(lines)
+        position = end
+    parts.extend(old_lines[position:])
+    return "".join(parts)
+
+
+def _is_snapshot_version(version: int) -> bool:
+    return SNAPSHOT_INTERVAL <= 1 or version % SNAPSHOT_INTERVAL == 1
+
+
+def has_revision(db: Session, document_id: int, version: int) -> bool:
+    return db.execute(
+        select(DocumentRevision.version).where(
+            DocumentRevision.document_id == document_id, DocumentRevision.version == version
+        )
+    ).first() is not None
+
+
+def record_revision(
+    db: Session,
+    document_id: int,
+    version: int,
+    title: str,
+    content: str,
+    previous: Optional[Tuple[int, str]] = None,
+    form_schema: Optional[dict] = None,
+) -> None:
+    """Store version of a document; previous is (version, content) of the revision before it.
+
+    form_schema is compiled from content when not given. A delta is only
+    kept when the previous revision is stored and the delta is actually
+    smaller than the content.
+    """
+    kind, data = SNAPSHOT, content
+    if previous is not None and not _is_snapshot_version(version):
+        previous_version, previous_content = previous
+        if has_revision(db, document_id, previous_version):
+            delta = make_delta(previous_content, content)
+            if len(delta) < len(content):
+                kind, data = DELTA, delta
+    if form_schema is None:
+        form_schema = parse_form_schema(content)
+    db.add(
+        DocumentRevision(
+            document_id=document_id,
+            version=version,
+            kind=kind,
+            title=title,
+            data=data,
+            content_length=len(content),
+            form_schema=form_schema,
+        )
+    )
+
+
+def ensure_revision(db: Session, document_id: int, version: int, title: str, content: str) -> None:
+    """Snapshot the current content of a document saved before revisions were tracked"""
+    if not has_revision(db, document_id, version):
+        record_revision(db, document_id, version, title, content)
+
+
+def retitle_revision(db: Session, document_id: int, version: int, title: str, content: str) -> None:
+    """Give the stored revision of the current version a new title (renames keep the version)"""
+    result = db.execute(
+        update(DocumentRevision)
+        .where(DocumentRevision.document_id == document_id, DocumentRevision.version == version)
+        .values(title=title)
+    )
+    if result.rowcount == 0:
+        record_revision(db, document_id, version, title, content)
+
+
+def load_revision(db: Session, document_id: int, version: int) -> Optional[dict]:
+    """Rebuild a version by applying the deltas after its nearest snapshot"""
+    base = (
+        select(func.max(DocumentRevision.version))
+        .where(
+            DocumentRevision.document_id == document_id,
+            DocumentRevision.version <= version,
+            DocumentRevision.kind == SNAPSHOT,
+        )
+        .scalar_subquery()
+    )
+    chain = db.execute(
+        select(DocumentRevision)
+        .where(
+            DocumentRevision.document_id == document_id,
+            DocumentRevision.version >= base,
+            DocumentRevision.version <= version,
+        )
+        .order_by(DocumentRevision.version)
+    ).scalars().all()
+    if not chain or chain[-1].version != version:
+        return None
+    content = chain[0].data
+    for revision in chain[1:]:
+        content = apply_delta(content, revision.data)
+    return {
+        "document_id": document_id,
+        "version": version,
+        "title": chain[-1].title,
+        "content": content,
+        "created_at": chain[-1].created_at,
+    }
+
+
+def list_revisions(db: Session, document_id: int) -> List:
+    """Revision metadata, newest first, without reading the stored data"""
+    return db.execute(
+        select(
+            DocumentRevision.version,
+            DocumentRevision.kind,
+            DocumentRevision.title,
+            DocumentRevision.content_length,
+            func.length(DocumentRevision.data).label("stored_length"),
+            DocumentRevision.created_at,
+        )
+        .where(DocumentRevision.document_id == document_id)
+        .order_by(DocumentRevision.version.desc())
+    ).all()
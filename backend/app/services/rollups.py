@@ -0,0 +1,168 @@
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.orm import Session
+from app.models.database import ControlRollup, FormSubmission
+from app.services import node_tree
+from app.services.answers import normalize_answers
+
+RESULT_COLUMNS = {
+    "pass": "pass_count",
+    "warning": "warning_count",
+    "fail": "fail_count",
+}
+
+REBUILD_BATCH_SIZE = 1000
+
+# (document_id, control_id) -> {"label": str, "pass_count": int, ...}
+Deltas = Dict[Tuple[int, str], dict]
+
+
+def _empty_delta() -> dict:
+    return {"label": "", "pass_count": 0, "warning_count": 0, "fail_count": 0}
+
+
+def count_answers(deltas: Deltas, document_id: int, answers) -> Deltas:
+    """Add one submission's (normalized) answers to deltas"""
+    for answer in normalize_answers(answers):
+        column = RESULT_COLUMNS.get(answer["result"])
+        if column is None:
+            continue
+        delta = deltas.setdefault((document_id, answer["id"]), _empty_delta())
+        delta[column] += 1
+        if answer["label"]:
+            delta["label"] = answer["label"]
+    return deltas
+
+
+def _dialect_insert(db: Session):
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+    return insert
+
+
+def add_counts(db: Session, deltas: Deltas) -> None:
+    """Atomically add deltas to the rollup table (one upsert statement)"""
+    if not deltas:
+        return
+    rows = [
+        {"document_id": document_id, "control_id": control_id, **delta}
+        for (document_id, control_id), delta in deltas.items()
+    ]
+    insert = _dialect_insert(db)
+    if insert is None:
+        _add_counts_portable(db, rows)
+        return
+    stmt = insert(ControlRollup)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[ControlRollup.document_id, ControlRollup.control_id],
+        set_={
+            # An answer without a label keeps the stored one
+            "label": func.coalesce(func.nullif(stmt.excluded.label, ""), ControlRollup.label),
+            "pass_count": ControlRollup.pass_count + stmt.excluded.pass_count,
+            "warning_count": ControlRollup.warning_count + stmt.excluded.warning_count,
+            "fail_count": ControlRollup.fail_count + stmt.excluded.fail_count,
+        },
+    )
+    db.execute(stmt, rows)
+
+
+def _add_counts_portable(db: Session, rows: List[dict]) -> None:
+    for row in rows:
+        result = db.execute(
+            update(ControlRollup)
+            .where(
+                ControlRollup.document_id == row["document_id"],
+                ControlRollup.control_id == row["control_id"],
+            )
+            .values(
+                label=row["label"] or ControlRollup.label,
+                pass_count=ControlRollup.pass_count + row["pass_count"],
+                warning_count=ControlRollup.warning_count + row["warning_count"],
+                fail_count=ControlRollup.fail_count + row["fail_count"],
+            )
+        )
+        if not result.rowcount:
+            db.add(ControlRollup(**row))
+    db.flush()
+
+
+def subtract_counts(db: Session, deltas: Deltas) -> None:
+    """Remove deltas from the rollup table"""
+    for (document_id, control_id), delta in deltas.items():
+        db.execute(
+            update(ControlRollup)
+            .where(
+                ControlRollup.document_id == document_id,
+                ControlRollup.control_id == control_id,
+            )
+            .values(
+                pass_count=ControlRollup.pass_count - delta["pass_count"],
+                warning_count=ControlRollup.warning_count - delta["warning_count"],
+                fail_count=ControlRollup.fail_count - delta["fail_count"],
+            )
+        )
+
+
+def record_submission(db: Session, document_id: int, answers) -> None:
+    add_counts(db, count_answers({}, document_id, answers))
+
+
+def remove_submission(db: Session, document_id: int, answers) -> None:
+    subtract_counts(db, count_answers({}, document_id, answers))
+
+
+def rebuild_rollups(db: Session, document_id: Optional[int] = None) -> int:
+    """Recompute rollups from the submissions table; returns the submissions scanned"""
+    clear = delete(ControlRollup)
+    query = select(FormSubmission.document_id, FormSubmission.answers)
+    if document_id is not None:
+        clear = clear.where(ControlRollup.document_id == document_id)
+        query = query.where(FormSubmission.document_id == document_id)
+    db.execute(clear)
+
+    deltas: Deltas = {}
+    scanned = 0
+    for row in db.execute(query.execution_options(yield_per=REBUILD_BATCH_SIZE)):
+        count_answers(deltas, row.document_id, row.answers)
+        scanned += 1
+    if deltas:
+        db.execute(
+            ControlRollup.__table__.insert(),
+            [
+                {"document_id": doc_id, "control_id": control_id, **delta}
+                for (doc_id, control_id), delta in deltas.items()
+            ],
+        )
+    return scanned
+
+
+def get_rollups(db: Session, document_id: Optional[int] = None) -> List[dict]:
+    """Per-document totals with their per-control counts, leaving out documents being purged"""
+    query = (
+        select(ControlRollup)
+        .where(ControlRollup.document_id.not_in(node_tree.hidden_document_ids()))
+        .order_by(ControlRollup.document_id, ControlRollup.control_id)
+    )
+    if document_id is not None:
+        query = query.where(ControlRollup.document_id == document_id)
+
+    documents: Dict[int, dict] = {}
+    for rollup in db.execute(query).scalars():
+        document = documents.get(rollup.document_id)
+        if document is None:
+            document = documents[rollup.document_id] = {
+                "document_id": rollup.document_id,
+                "pass_count": 0,
+                "warning_count": 0,
+                "fail_count": 0,
+                "controls": [],
+            }
+        for column in RESULT_COLUMNS.values():
+            document[column] += getattr(rollup, column)
+        document["controls"].append(rollup)
+    return list(documents.values())
@@ -0,0 +1,213 @@
+import re
+from datetime import datetime
+from typing import List, NamedTuple, Optional
+from sqlalchemy import and_, column, func, literal, literal_column, or_, select, table
+from sqlalchemy.orm import Session
+from app.models.database import SEARCH_LANGUAGE, Document
+from app.services import node_tree
+
+HIGHLIGHT_START = "<mark>"
+HIGHLIGHT_STOP = "</mark>"
+SNIPPET_WORDS = 24
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+class SearchHit(NamedTuple):
+    """A result row shaped like the ones the SQL backends return"""
+    id: int
+    node_id: int
+    title: str
+    version: int
+    updated_at: datetime
+    rank: float
+    title_highlight: str
+    snippet: str
+
+
+def fts5_query(query: str) -> Optional[str]:
+    """Turn free text into an FTS5 query matching every word (the last one as a prefix).
+
+    Each word is quoted, so FTS5 operators and punctuation typed by users
+    cannot produce a syntax error.
+    """
+    words = _WORD.findall(query)
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+def _scope(stmt, node_id: Optional[int], include_descendants: bool):
+    stmt = stmt.where(Document.node_id.not_in(node_tree.hidden_ids()))
+    if node_id:
+        if include_descendants:
+            return stmt.where(Document.node_id.in_(node_tree.subtree_ids(node_id)))
+        return stmt.where(Document.node_id == node_id)
+    return stmt
+
+
+def _postgres_search(db, query, node_id, include_descendants, limit, after):
+    # Must match the configuration the generated column was built with to use the index
+    config = literal_column(f"'{SEARCH_LANGUAGE}'::regconfig")
+    tsquery = func.websearch_to_tsquery(config, query)
+    vector = literal_column("documents.search_vector")
+    rank = func.ts_rank_cd(vector, tsquery).label("rank")
+    # Rank and page on the GIN index first; headlines are computed for the page only
+    ranked = _scope(select(Document.id, rank).where(vector.op("@@")(tsquery)), node_id, include_descendants)
+    if after is not None:
+        last_rank, last_id = after
+        ranked = ranked.where(
+            or_(rank < last_rank, and_(rank == last_rank, Document.id > last_id))
+        )
+    page = ranked.order_by(rank.desc(), Document.id).limit(limit).subquery()
+    options = (
+        f"StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_STOP}, "
+        f"MaxWords={SNIPPET_WORDS}, MinWords={SNIPPET_WORDS // 2}, MaxFragments=2"
+    )
+    return db.execute(
+        select(
+            Document.id,
+            Document.node_id,
+            Document.title,
+            Document.version,
+            Document.updated_at,
+            page.c.rank,
+            func.ts_headline(config, Document.title, tsquery, "HighlightAll=true").label("title_highlight"),
+            func.ts_headline(config, Document.content, tsquery, options).label("snippet"),
+        )
+        .join(page, page.c.id == Document.id)
+        .order_by(page.c.rank.desc(), Document.id)
+    ).all()
+
+
+def _terms(words: List[str]):
+    """Regex for the words of an FTS5 query built by fts5_query (the last one as a prefix)"""
+    alternatives = [re.escape(word) for word in words[:-1]] + [re.escape(words[-1]) + r"\w*"]
+    return re.compile(r"\b(?:" + "|".join(alternatives) + r")\b", re.IGNORECASE | re.UNICODE)
+
+
+def _highlight(text: str, terms) -> str:
+    return terms.sub(lambda m: f"{HIGHLIGHT_START}{m.group(0)}{HIGHLIGHT_STOP}", text)
+
+
+def _snippet(content: str, terms) -> str:
+    """About SNIPPET_WORDS // 2 words of content around its first matching term, highlighted.
+
+    Stands in for FTS5's snippet(), which tokenizes and scores the whole
+    document; this only scans up to the first hit.
+    """
+    hit = terms.search(content)
+    at = hit.start() if hit else 0
+    before = list(_WORD.finditer(content, max(0, at - 200), at))[-3:]
+    first = before[0].start() if before else at
+    words = []
+    for word in _WORD.finditer(content, first):
+        words.append(word)
+        if len(words) == SNIPPET_WORDS // 2:
+            break
+    if not words:
+        return ""
+    last = words[-1].end()
+    text = _highlight(content[first:last], terms)
+    prefix = "…" if _WORD.search(content, 0, first) else ""
+    suffix = "…" if _WORD.search(content, last) else ""
+    return f"{prefix}{text}{suffix}"
+
+
+def _sqlite_search(db, query, node_id, include_descendants, limit, after):
+    match = fts5_query(query)
+    if match is None:
+        return []
+    fts = table("documents_fts", column("rowid"))
+    fts_table = literal_column("documents_fts")
+    # bm25 is lower-is-better; negate it so both backends rank descending
+    rank = (-func.bm25(fts_table, 10.0, 1.0)).label("rank")
+    # Rank and page on the index first; only the page's rows are read in full
+    ranked = _scope(
+        select(Document.id, rank)
+        .select_from(fts)
+        .join(Document, Document.id == fts.c.rowid)
+        .where(fts_table.op("MATCH")(match)),
+        node_id,
+        include_descendants,
+    )
+    if after is not None:
+        last_rank, last_id = after
+        ranked = ranked.where(or_(rank < last_rank, and_(rank == last_rank, Document.id > last_id)))
+    page = ranked.order_by(rank.desc(), Document.id).limit(limit).subquery()
+    rows = db.execute(
+        select(
+            Document.id,
+            Document.node_id,
+            Document.title,
+            Document.version,
+            Document.updated_at,
+            Document.content,
+            page.c.rank,
+        )
+        .join(page, page.c.id == Document.id)
+        .order_by(page.c.rank.desc(), Document.id)
+    ).all()
+    terms = _terms(_WORD.findall(query))
+    return [
+        SearchHit(
+            row.id,
+            row.node_id,
+            row.title,
+            row.version,
+            row.updated_at,
+            row.rank,
+            _highlight(row.title, terms),
+            _snippet(row.content, terms),
+        )
+        for row in rows
+    ]
+
+
+def _like_search(db, query, node_id, include_descendants, limit, after):
+    """Fallback for databases without a full-text index: every word in the title or content"""
+    words = _WORD.findall(query)
+    if not words:
+        return []
+    rank = literal(0.0).label("rank")
+    stmt = select(
+        Document.id,
+        Document.node_id,
+        Document.title,
+        Document.version,
+        Document.updated_at,
+        rank,
+        Document.title.label("title_highlight"),
+        func.substr(Document.content, 1, SNIPPET_WORDS * 8).label("snippet"),
+    )
+    for word in words:
+        pattern = f"%{word}%"
+        stmt = stmt.where(or_(Document.title.ilike(pattern), Document.content.ilike(pattern)))
+    stmt = _scope(stmt, node_id, include_descendants)
+    if after is not None:
+        # Unranked: pages follow the id
+        stmt = stmt.where(Document.id > after[1])
+    return db.execute(stmt.order_by(Document.id).limit(limit)).all()
+
+
+def search_documents(
+    db: Session,
+    query: str,
+    node_id: Optional[int] = None,
+    include_descendants: bool = False,
+    limit: int = 20,
+    after: Optional[tuple] = None,
+) -> List:
+    """Documents matching query, best first, with highlighted title and content snippet.
+
+    after is the (rank, id) of the last row of the previous page. Other
+    databases fall back to an unranked substring search.
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        return _postgres_search(db, query, node_id, include_descendants, limit, after)
+    if dialect == "sqlite":
+        return _sqlite_search(db, query, node_id, include_descendants, limit, after)
+    return _like_search(db, query, node_id, include_descendants, limit, after)
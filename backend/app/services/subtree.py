@@ -0,0 +1,211 @@
+from datetime import datetime
+from typing import Iterable, List, Optional
+from sqlalchemy import Column, Integer, MetaData, Table, case, delete, func, insert, literal, select, update
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import CreateTable
+from app.models.database import ControlRollup, Document, DocumentRevision, FormSubmission, TreeNode
+from app.services import node_tree
+from app.services.node_tree import Closure
+from app.services.revisions import SNAPSHOT
+from app.services.tree_cache import bump_tree_version
+
+# Per-connection old id -> new id maps that let every copy step run as one
+# INSERT ... SELECT; only ids pass through Python, never content or answers
+_maps = MetaData()
+
+
+def _id_map(name: str) -> Table:
+    return Table(
+        name,
+        _maps,
+        Column("old_id", Integer, primary_key=True, autoincrement=False),
+        Column("new_id", Integer, nullable=False),
+        prefixes=["TEMPORARY"],
+        postgresql_on_commit="DELETE ROWS",
+    )
+
+
+node_map = _id_map("copy_node_map")
+document_map = _id_map("copy_document_map")
+
+
+def _allocate_ids(db: Session, model, count: int) -> List[int]:
+    """Reserve count primary keys for explicit inserts into model's table"""
+    if not count:
+        return []
+    if db.get_bind().dialect.name == "postgresql":
+        sequence = func.pg_get_serial_sequence(model.__tablename__, "id")
+        return list(db.scalars(select(func.nextval(sequence)).select_from(func.generate_series(1, count))))
+    # SQLite assigns max(id) + 1; the write lock this transaction already
+    # holds (see copy_subtree) keeps other writers out of the range
+    start = db.scalar(select(func.coalesce(func.max(model.id), 0)))
+    return list(range(start + 1, start + 1 + count))
+
+
+def _fill_map(db: Session, table: Table, old_ids: List[int], new_ids: Iterable[int]) -> None:
+    db.execute(CreateTable(table, if_not_exists=True))
+    db.execute(delete(table))
+    if old_ids:
+        db.execute(insert(table), [{"old_id": old, "new_id": new} for old, new in zip(old_ids, new_ids)])
+
+
+def copy_subtree(
+    db: Session,
+    node_id: int,
+    parent_id: Optional[int],
+    name: Optional[str] = None,
+    include_submissions: bool = False,
+) -> dict:
+    """Deep-copy node_id with its descendants and their documents under parent_id.
+
+    Copied documents start a new history at version 1 (a snapshot of the
+    current content, keeping its compiled form schema). With
+    include_submissions the submissions and control rollups are copied too.
+    Runs a fixed number of set-based statements whatever the subtree size;
+    the caller commits. Raises ValueError if node_id is missing or being
+    purged.
+    """
+    # Also takes the SQLite write lock before ids are allocated
+    bump_tree_version(db)
+    now = datetime.utcnow()
+
+    # Nodes queued for purging stay behind (they are not copied with deleted_at)
+    old_nodes = list(
+        db.scalars(
+            node_tree.subtree_ids(node_id)
+            .where(Closure.c.descendant_id.not_in(node_tree.hidden_ids()))
+            .order_by(Closure.c.descendant_id)
+        )
+    )
+    if node_id not in old_nodes:
+        raise ValueError(f"Node {node_id} not found")
+    new_nodes = _allocate_ids(db, TreeNode, len(old_nodes))
+    _fill_map(db, node_map, old_nodes, new_nodes)
+    new_root = new_nodes[old_nodes.index(node_id)]
+
+    source = TreeNode.__table__.alias("source")
+    parent_map = node_map.alias("parent_map")
+    is_root = source.c.id == node_id
+    db.execute(
+        insert(TreeNode).from_select(
+            ["id", "name", "parent_id", "created_at", "updated_at"],
+            select(
+                node_map.c.new_id,
+                case((is_root, literal(name)), else_=source.c.name) if name else source.c.name,
+                case((is_root, literal(parent_id, Integer)), else_=parent_map.c.new_id),
+                literal(now),
+                literal(now),
+            )
+            .select_from(source)
+            .join(node_map, node_map.c.old_id == source.c.id)
+            .outerjoin(parent_map, parent_map.c.old_id == source.c.parent_id),
+        )
+    )
+
+    # Paths inside the copy mirror the original's; then hang it under parent_id
+    ancestor_map = node_map.alias("ancestor_map")
+    db.execute(
+        insert(Closure).from_select(
+            ["ancestor_id", "descendant_id", "depth"],
+            select(ancestor_map.c.new_id, node_map.c.new_id, Closure.c.depth)
+            .select_from(Closure)
+            .join(ancestor_map, ancestor_map.c.old_id == Closure.c.ancestor_id)
+            .join(node_map, node_map.c.old_id == Closure.c.descendant_id),
+        )
+    )
+    if parent_id is not None:
+        node_tree.link_subtree(db, new_root, parent_id)
+
+    old_documents = list(
+        db.scalars(select(Document.id).where(Document.node_id.in_(select(node_map.c.old_id))).order_by(Document.id))
+    )
+    _fill_map(db, document_map, old_documents, _allocate_ids(db, Document, len(old_documents)))
+    db.execute(
+        insert(Document).from_select(
+            ["id", "node_id", "title", "content", "version", "created_at", "updated_at"],
+            select(
+                document_map.c.new_id,
+                node_map.c.new_id,
+                Document.title,
+                Document.content,
+                literal(1),
+                literal(now),
+                literal(now),
+            )
+            .join(document_map, document_map.c.old_id == Document.id)
+            .join(node_map, node_map.c.old_id == Document.node_id),
+        )
+    )
+    db.execute(
+        insert(DocumentRevision).from_select(
+            ["document_id", "version", "kind", "title", "data", "content_length", "form_schema", "created_at"],
+            select(
+                document_map.c.new_id,
+                literal(1),
+                literal(SNAPSHOT),
+                Document.title,
+                Document.content,
+                func.length(Document.content),
+                DocumentRevision.form_schema,
+                literal(now),
+            )
+            .join(document_map, document_map.c.old_id == Document.id)
+            .outerjoin(
+                DocumentRevision,
+                (DocumentRevision.document_id == Document.id) & (DocumentRevision.version == Document.version),
+            ),
+        )
+    )
+
+    submission_count = 0
+    if include_submissions and old_documents:
+        submission_count = db.execute(
+            insert(FormSubmission).from_select(
+                ["document_id", "user_id", "answers", "answers_version", "submitted_at"],
+                select(
+                    document_map.c.new_id,
+                    FormSubmission.user_id,
+                    FormSubmission.answers,
+                    FormSubmission.answers_version,
+                    FormSubmission.submitted_at,
+                ).join(document_map, document_map.c.old_id == FormSubmission.document_id),
+            )
+        ).rowcount
+        db.execute(
+            insert(ControlRollup).from_select(
+                ["document_id", "control_id", "label", "pass_count", "warning_count", "fail_count"],
+                select(
+                    document_map.c.new_id,
+                    ControlRollup.control_id,
+                    ControlRollup.label,
+                    ControlRollup.pass_count,
+                    ControlRollup.warning_count,
+                    ControlRollup.fail_count,
+                ).join(document_map, document_map.c.old_id == ControlRollup.document_id),
+            )
+        )
+
+    db.execute(delete(node_map))
+    db.execute(delete(document_map))
+    return {
+        "node_id": new_root,
+        "node_count": len(old_nodes),
+        "document_count": len(old_documents),
+        "submission_count": submission_count,
+    }
+
+
+def move_subtrees(db: Session, node_ids: List[int], parent_id: Optional[int]) -> None:
+    """Move several subtrees under parent_id (None for the top level); the caller validates and commits.
+
+    Each move re-links its closure rows with a few set-based statements, so
+    the cost does not depend on the size of the subtrees.
+    """
+    for node_id in node_ids:
+        node_tree.move_node(db, node_id, parent_id)
+    db.execute(
+        update(TreeNode)
+        .where(TreeNode.id.in_(node_ids))
+        .values(parent_id=parent_id, updated_at=datetime.utcnow())
+    )
+    bump_tree_version(db)
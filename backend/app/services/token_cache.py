@@ -0,0 +1,74 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+
+class TokenCache:
+    """Bounded LRU of verified tokens, keyed by the SHA-256 digest of the raw token.
+
+    Entries never outlive the token's ``exp`` claim (or ``max_ttl`` seconds,
+    whichever comes first), so a cached token stops being accepted as soon as
+    the token itself would be rejected.
+    """
+
+    def __init__(self, max_size: Optional[int] = None, max_ttl: Optional[float] = None):
+        self.max_size = max_size if max_size is not None else int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+        self.max_ttl = max_ttl if max_ttl is not None else float(os.getenv("TOKEN_CACHE_MAX_TTL", "300"))
+        self._entries: "OrderedDict[bytes, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        """Return the cached user dict for token, or None if absent or expired"""
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, user_info = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return user_info
+
+    def put(self, token: str, user_info: Dict[str, Any], exp: Optional[float]) -> None:
+        """Cache user_info for token until min(exp, now + max_ttl)"""
+        if self.max_size <= 0:
+            return
+        expires_at = time.time() + self.max_ttl
+        if exp is not None:
+            expires_at = min(expires_at, float(exp))
+        if expires_at <= time.time():
+            return
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (expires_at, user_info)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
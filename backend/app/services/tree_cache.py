@@ -0,0 +1,54 @@
+import threading
+from typing import Optional
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+from app.models.database import CacheVersion
+
+TREE_VERSION_KEY = "node_tree"
+
+
+def get_tree_version(db: Session) -> int:
+    """Read the current tree version (a single primary-key lookup)"""
+    version = db.execute(
+        select(CacheVersion.version).where(CacheVersion.name == TREE_VERSION_KEY)
+    ).scalar()
+    return version or 0
+
+
+def bump_tree_version(db: Session) -> None:
+    """Invalidate cached trees in every worker; call inside the mutating transaction"""
+    result = db.execute(
+        update(CacheVersion)
+        .where(CacheVersion.name == TREE_VERSION_KEY)
+        .values(version=CacheVersion.version + 1)
+    )
+    if not result.rowcount:
+        db.add(CacheVersion(name=TREE_VERSION_KEY, version=1))
+        db.flush()
+
+
+def tree_etag(version: int, *variant) -> str:
+    suffix = "".join(f"-{v}" for v in variant if v is not None)
+    return f'"tree-{version}{suffix}"'
+
+
+class TreeCache:
+    """Serialized full tree for the latest version seen by this worker"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version: Optional[int] = None
+        self._body: Optional[bytes] = None
+
+    def get(self, version: int) -> Optional[bytes]:
+        with self._lock:
+            return self._body if self._version == version else None
+
+    def set(self, version: int, body: bytes) -> None:
+        with self._lock:
+            if self._version is None or version >= self._version:
+                self._version = version
+                self._body = body
+
+
+tree_cache = TreeCache()
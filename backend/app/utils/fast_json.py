@@ -0,0 +1,21 @@
+import os
+from typing import Any, Dict, Optional
+from fastapi import Response
+
+try:
+    import orjson
+except ImportError:  # optional; the fast path stays off without it
+    orjson = None
+
+# Opt-in: list endpoints build JSON straight from SQL rows instead of
+# validating them through their response_model (the OpenAPI schema is unchanged)
+FAST_JSON = orjson is not None and os.getenv("FAST_JSON", "false").lower() in ("1", "true", "yes")
+
+
+def dumps(payload: Any) -> bytes:
+    """Encode rows already shaped like the response model; datetimes come out as ISO 8601"""
+    return orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS)
+
+
+def json_response(payload: Any, headers: Optional[Dict[str, str]] = None) -> Response:
+    return Response(content=dumps(payload), media_type="application/json", headers=headers)
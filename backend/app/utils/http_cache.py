@@ -0,0 +1,42 @@
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """True if an If-None-Match / If-Match header value matches etag (weak comparison)"""
+    if not if_none_match:
+        return False
+    wanted = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == wanted:
+            return True
+    return False
+
+
+def _as_utc(value: datetime) -> datetime:
+    # Naive datetimes in this app are UTC (datetime.utcnow defaults)
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+def http_date(value: datetime) -> str:
+    """Format a timestamp for Last-Modified"""
+    return format_datetime(_as_utc(value).replace(microsecond=0), usegmt=True)
+
+
+def not_modified_since(if_modified_since: Optional[str], last_modified: datetime) -> bool:
+    """True if an If-Modified-Since header is at or after last_modified (second precision)"""
+    if not if_modified_since:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return _as_utc(last_modified).replace(microsecond=0) <= since
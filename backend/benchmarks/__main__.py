@@ -0,0 +1,154 @@
+"""
+Generate (if needed) a synthetic dataset, benchmark the API endpoints
+against it and optionally check the results against a stored baseline.
+Exits with status 1 when a scenario returned errors or regressed.
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+DEFAULT_DATABASE_URL = "sqlite:///./benchmark.db"
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__)
+    parser.add_argument(
+        "--database-url",
+        default=DEFAULT_DATABASE_URL,
+        help=f"Sync SQLAlchemy URL of a SQLite file or local PostgreSQL database (default {DEFAULT_DATABASE_URL})",
+    )
+    parser.add_argument("--size", choices=("small", "medium", "large"), default="small", help="Dataset size")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed of the generated dataset")
+    parser.add_argument(
+        "--reset",
+        action="store_true",
+        help="Drop and recreate ALL tables of the database before generating",
+    )
+    parser.add_argument("--generate-only", action="store_true", help="Stop after generating the dataset")
+    parser.add_argument(
+        "--scenario",
+        action="append",
+        help="Only run scenarios whose name starts with this (repeatable), e.g. nodes. or documents.search",
+    )
+    parser.add_argument("--requests", type=int, default=200, help="Timed requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=4, help="Requests in flight at once")
+    parser.add_argument("--warmup", type=int, default=10, help="Untimed requests before each scenario")
+    parser.add_argument(
+        "--memory-requests", type=int, default=5, help="Sequential requests traced for peak memory"
+    )
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="Baseline JSON file to compare against")
+    parser.add_argument(
+        "--save-baseline", action="store_true", help="Write the results to --baseline instead of comparing"
+    )
+    parser.add_argument(
+        "--max-regression",
+        type=float,
+        default=0.25,
+        help="Allowed slowdown / memory growth before failing, as a fraction (default 0.25)",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    if args.save_baseline and not args.baseline:
+        print("--save-baseline needs --baseline", file=sys.stderr)
+        return 2
+
+    # The app reads its database settings at import time
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ.pop("ASYNC_DATABASE_URL", None)
+    from app.api.main import app
+    from app.models.database import SessionLocal, async_engine, engine, init_db
+    from benchmarks import dataset, runner
+    from benchmarks.scenarios import build_scenarios, select_scenarios
+
+    if args.reset:
+        print(f"Resetting {engine.url.render_as_string(hide_password=True)}...")
+        dataset.reset_database()
+    else:
+        init_db()
+
+    db = SessionLocal()
+    try:
+        info = dataset.describe_dataset(db)
+    finally:
+        db.close()
+    if info is None:
+        print(f"Generating the {args.size} dataset (seed {args.seed})...")
+        info = dataset.generate(args.size, args.seed)
+    elif info["size"] != args.size:
+        print(
+            f"The database holds the {info['size']} dataset; use --reset to replace it with {args.size}",
+            file=sys.stderr,
+        )
+        return 2
+    if args.generate_only:
+        return 0
+
+    scenarios = select_scenarios(build_scenarios(info), args.scenario)
+    if not scenarios:
+        print("No scenario matches --scenario", file=sys.stderr)
+        return 2
+    metadata = runner.run_metadata(
+        info,
+        engine.dialect.name,
+        requests=args.requests,
+        concurrency=args.concurrency,
+        fast_json=os.getenv("FAST_JSON", "false"),
+    )
+    print(f"\n{runner.HEADER}")
+    results = asyncio.run(
+        _run(app, async_engine, runner, scenarios, args)
+    )
+
+    if args.output:
+        runner.save_results(args.output, metadata, results)
+    status = 0
+    failed = [name for name, result in results.items() if result["errors"]]
+    if failed:
+        print(f"\nScenarios with error responses: {', '.join(failed)}", file=sys.stderr)
+        status = 1
+
+    if args.baseline and args.save_baseline:
+        runner.save_results(args.baseline, metadata, results)
+        print(f"\nBaseline written to {args.baseline}")
+    elif args.baseline:
+        baseline = runner.load_results(args.baseline)
+        recorded = baseline["metadata"]
+        if (recorded["dataset"], recorded["backend"]) != (metadata["dataset"], metadata["backend"]):
+            print(
+                f"\nBaseline was recorded on the {recorded['dataset']} dataset with {recorded['backend']}; "
+                f"this run used {metadata['dataset']} with {metadata['backend']}",
+                file=sys.stderr,
+            )
+            return 2
+        regressions = runner.compare(results, baseline["scenarios"], args.max_regression)
+        if regressions:
+            print(f"\nRegressions beyond {args.max_regression:.0%}:", file=sys.stderr)
+            for regression in regressions:
+                print(f"  {regression}", file=sys.stderr)
+            status = 1
+        else:
+            print(f"\nNo regressions beyond {args.max_regression:.0%} against {args.baseline}")
+    return status
+
+
+async def _run(app, async_engine, runner, scenarios, args):
+    try:
+        return await runner.run_scenarios(
+            app,
+            scenarios,
+            requests=args.requests,
+            concurrency=args.concurrency,
+            warmup=args.warmup,
+            memory_requests=args.memory_requests,
+        )
+    finally:
+        await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
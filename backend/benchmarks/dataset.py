@@ -0,0 +1,313 @@
+"""
+Synthetic data for the benchmarks: deep and wide node trees, MDX form
+documents (a few of them very large) and submissions in both the canonical
+and the legacy answer shapes. Generation is deterministic for a given seed.
+"""
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from sqlalchemy import func, insert, inspect, select, text
+from sqlalchemy.orm import Session
+from app.models.database import (
+    Base,
+    Document,
+    FormSubmission,
+    SessionLocal,
+    TreeNode,
+    engine,
+    init_db,
+)
+from app.services import node_tree
+from app.services.answers import CURRENT_ANSWERS_VERSION
+from app.services.form_schema import parse_form_schema
+from app.services.revisions import record_revision
+from app.services.rollups import rebuild_rollups
+from app.services.tree_cache import bump_tree_version
+
+# deep: length of a single chain of nested nodes
+# wide: children of a single node
+# fanout / levels: a balanced tree with fanout ** 1 + ... + fanout ** levels nodes
+# documents: ordinary documents of about 4 KB; large_documents: large_document_kb each
+# submissions: total rows, legacy_ratio of them stored in pre-migration shapes
+SIZES: Dict[str, dict] = {
+    "small": {
+        "deep": 50,
+        "wide": 500,
+        "fanout": 4,
+        "levels": 4,
+        "documents": 100,
+        "large_documents": 2,
+        "large_document_kb": 256,
+        "submissions": 20_000,
+        "legacy_ratio": 0.3,
+    },
+    "medium": {
+        "deep": 200,
+        "wide": 5_000,
+        "fanout": 6,
+        "levels": 5,
+        "documents": 1_000,
+        "large_documents": 10,
+        "large_document_kb": 1_024,
+        "submissions": 500_000,
+        "legacy_ratio": 0.3,
+    },
+    "large": {
+        "deep": 1_000,
+        "wide": 20_000,
+        "fanout": 8,
+        "levels": 5,
+        "documents": 5_000,
+        "large_documents": 20,
+        "large_document_kb": 4_096,
+        "submissions": 5_000_000,
+        "legacy_ratio": 0.3,
+    },
+}
+
+INSERT_BATCH_SIZE = 10_000
+
+DEEP_ROOT = "Deep 0"
+WIDE_ROOT = "Wide"
+BALANCED_ROOT = "Balanced"
+
+_WORDS = (
+    "inspection valve pressure reading operator shift line sample batch tolerance "
+    "calibration torque seal pump filter gauge temperature record check verify "
+    "procedure step safety sensor flow rate limit result sign report"
+).split()
+
+NUMBER_CONTROLS = ("n1", "n2", "n3", "n4")
+DROPDOWN_OPTIONS = ("ok", "adjust", "replace")
+
+
+def _paragraph(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(_WORDS) for _ in range(words)).capitalize() + "."
+
+
+def _form_controls() -> str:
+    lines = [
+        f'<NumberInput id="{control_id}" label="Measurement {index}" '
+        f"pass={{{{min: 0, max: 10}}}} warn={{{{min: 10, max: 20}}}} required />"
+        for index, control_id in enumerate(NUMBER_CONTROLS, 1)
+    ]
+    options = ", ".join(f'"{option}"' for option in DROPDOWN_OPTIONS)
+    lines.append(f'<Dropdown id="d1" label="Action" options={{[{options}]}} correct="ok" />')
+    lines.append('<TextInput id="t1" label="Notes" />')
+    lines.append('<Calculate id="total" label="Total" expression="n1 + n2 * 2" precision={2} />')
+    return "\n\n".join(lines)
+
+
+def make_mdx(rng: random.Random, title: str, size_kb: int) -> str:
+    """An MDX document of about size_kb KB: headed prose sections around one form"""
+    parts = [f"# {title}", _form_controls()]
+    size = sum(len(part) for part in parts)
+    section = 0
+    while size < size_kb * 1024:
+        section += 1
+        block = f"## Section {section}\n\n" + "\n\n".join(
+            _paragraph(rng, rng.randint(20, 60)) for _ in range(4)
+        )
+        parts.insert(-1, block)
+        size += len(block) + 2
+    return "\n\n".join(parts)
+
+
+def _answer_value(rng: random.Random, control_id: str):
+    if control_id in NUMBER_CONTROLS:
+        return round(rng.uniform(0, 25), 2)
+    if control_id == "d1":
+        return rng.choice(DROPDOWN_OPTIONS)
+    return _paragraph(rng, 6)
+
+
+def _canonical_answers(rng: random.Random) -> list:
+    answers = []
+    for control_id in (*NUMBER_CONTROLS, "d1", "t1"):
+        value = _answer_value(rng, control_id)
+        if control_id in NUMBER_CONTROLS:
+            result = "pass" if value <= 10 else "warning" if value <= 20 else "fail"
+        elif control_id == "d1":
+            result = "pass" if value == "ok" else "fail"
+        else:
+            result = "pass"
+        answers.append({"id": control_id, "label": control_id, "value": value, "result": result})
+    n1, n2 = answers[0]["value"], answers[1]["value"]
+    answers.append({"id": "total", "label": "Total", "value": round(n1 + n2 * 2, 2), "result": "pass"})
+    return answers
+
+
+def _legacy_answers(rng: random.Random):
+    """One of the shapes written before answers were normalized"""
+    values = {control_id: _answer_value(rng, control_id) for control_id in (*NUMBER_CONTROLS, "d1", "t1")}
+    shape = rng.randrange(3)
+    if shape == 0:
+        return values
+    if shape == 1:
+        return {key: {"value": value, "result": "pass"} for key, value in values.items()}
+    return [{"field_id": key, "answer": value} for key, value in values.items()]
+
+
+def _insert_returning_ids(db: Session, model, rows: List[dict]) -> List[int]:
+    ids: List[int] = []
+    for start in range(0, len(rows), INSERT_BATCH_SIZE):
+        ids.extend(
+            db.scalars(
+                insert(model).returning(model.id, sort_by_parameter_order=True),
+                rows[start:start + INSERT_BATCH_SIZE],
+            ).all()
+        )
+    return ids
+
+
+def _add_nodes(db: Session, names: List[str], parent_ids: List[Optional[int]], now: datetime) -> List[int]:
+    return _insert_returning_ids(
+        db,
+        TreeNode,
+        [
+            {"name": name, "parent_id": parent_id, "created_at": now, "updated_at": now}
+            for name, parent_id in zip(names, parent_ids)
+        ],
+    )
+
+
+def generate_tree(db: Session, size_name: str, size: dict, now: datetime) -> List[int]:
+    """Insert the three shapes level by level; returns the leaves of the balanced tree"""
+    parent = None
+    for level in range(size["deep"]):
+        (parent,) = _add_nodes(db, [f"Deep {level}"], [parent], now)  # the first is DEEP_ROOT
+
+    (wide_root,) = _add_nodes(db, [WIDE_ROOT], [None], now)
+    _add_nodes(db, [f"Wide child {i}" for i in range(size["wide"])], [wide_root] * size["wide"], now)
+
+    # The root's name records the size so an existing dataset can be recognised
+    (balanced_root,) = _add_nodes(db, [f"{BALANCED_ROOT} {size_name}"], [None], now)
+    level_ids = [balanced_root]
+    for level in range(size["levels"]):
+        parents = [node_id for node_id in level_ids for _ in range(size["fanout"])]
+        names = [f"Balanced {level}.{i}" for i in range(len(parents))]
+        level_ids = _add_nodes(db, names, parents, now)
+
+    node_tree.rebuild_closure(db)
+    bump_tree_version(db)
+    return level_ids
+
+
+def generate_documents(db: Session, rng: random.Random, size: dict, leaves: List[int], now: datetime):
+    """Documents spread over the balanced tree's leaves, each with its first revision and form schema"""
+    specs = [(f"Procedure {i}", 4) for i in range(size["documents"])]
+    specs += [(f"Large procedure {i}", size["large_document_kb"]) for i in range(size["large_documents"])]
+    rows = []
+    for title, size_kb in specs:
+        rows.append({
+            "node_id": rng.choice(leaves),
+            "title": title,
+            "content": make_mdx(rng, title, size_kb),
+            "version": 1,
+            "created_at": now,
+            "updated_at": now,
+        })
+    ids = _insert_returning_ids(db, Document, rows)
+    for document_id, row in zip(ids, rows):
+        record_revision(
+            db, document_id, 1, row["title"], row["content"], form_schema=parse_form_schema(row["content"])
+        )
+    db.flush()
+    return ids[: size["documents"]], ids[size["documents"]:]
+
+
+def generate_submissions(db: Session, rng: random.Random, size: dict, document_ids: List[int], progress=None):
+    """Insert submissions in batches, committing each; most go to a few hot documents"""
+    total = size["submissions"]
+    hot = document_ids[: max(1, len(document_ids) // 20)]
+    start = datetime.utcnow() - timedelta(seconds=total)
+    written = 0
+    while written < total:
+        rows = []
+        for offset in range(written, min(written + INSERT_BATCH_SIZE, total)):
+            legacy = rng.random() < size["legacy_ratio"]
+            rows.append({
+                "document_id": rng.choice(hot) if rng.random() < 0.8 else rng.choice(document_ids),
+                "user_id": f"user-{rng.randrange(500)}",
+                "answers": _legacy_answers(rng) if legacy else _canonical_answers(rng),
+                "answers_version": None if legacy else CURRENT_ANSWERS_VERSION,
+                "submitted_at": start + timedelta(seconds=offset),
+            })
+        db.execute(insert(FormSubmission), rows)
+        db.commit()
+        written += len(rows)
+        if progress:
+            progress(written, total)
+
+
+def reset_database() -> None:
+    """Drop every table of the target database (including the SQLite search index) and recreate them"""
+    with engine.begin() as conn:
+        if engine.dialect.name == "sqlite" and inspect(conn).has_table("documents_fts"):
+            conn.execute(text("DROP TABLE documents_fts"))
+    Base.metadata.drop_all(bind=engine)
+    init_db()
+
+
+def describe_dataset(db: Session) -> Optional[dict]:
+    """Size and notable ids of a generated dataset, found from its root nodes; None if there is none"""
+    roots = dict(db.execute(select(TreeNode.name, TreeNode.id).where(TreeNode.parent_id.is_(None))).all())
+    balanced = [name for name in roots if name.startswith(BALANCED_ROOT + " ")]
+    if DEEP_ROOT not in roots or WIDE_ROOT not in roots or len(balanced) != 1:
+        return None
+    found = {DEEP_ROOT: roots[DEEP_ROOT], WIDE_ROOT: roots[WIDE_ROOT], BALANCED_ROOT: roots[balanced[0]]}
+    deep_leaf = db.execute(
+        select(node_tree.Closure.c.descendant_id)
+        .where(node_tree.Closure.c.ancestor_id == found[DEEP_ROOT])
+        .order_by(node_tree.Closure.c.depth.desc())
+        .limit(1)
+    ).scalar_one()
+    counts = (
+        select(FormSubmission.document_id, func.count().label("submissions"))
+        .group_by(FormSubmission.document_id)
+        .order_by(func.count().desc(), FormSubmission.document_id)
+    )
+    busiest = db.execute(counts.limit(1)).first()
+    large = db.execute(
+        select(Document.id).where(Document.title.like("Large procedure %")).order_by(Document.id).limit(1)
+    ).scalar()
+    any_document = db.execute(select(func.min(Document.id))).scalar()
+    return {
+        "size": balanced[0][len(BALANCED_ROOT) + 1:],
+        "deep_root": found[DEEP_ROOT],
+        "deep_leaf": deep_leaf,
+        "wide_root": found[WIDE_ROOT],
+        "balanced_root": found[BALANCED_ROOT],
+        "hot_document": busiest.document_id if busiest else any_document,
+        "large_document": large or any_document,
+        "document": any_document,
+    }
+
+
+def generate(size_name: str, seed: int = 0, log=print) -> dict:
+    """Populate an empty database with the named dataset size"""
+    size = SIZES[size_name]
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        leaves = generate_tree(db, size_name, size, now)
+        db.commit()
+        log(f"  nodes: {db.scalar(select(func.count()).select_from(TreeNode))}")
+        documents, large = generate_documents(db, rng, size, leaves, now)
+        db.commit()
+        log(f"  documents: {len(documents)} + {len(large)} large")
+
+        def progress(written, total):
+            if written % (INSERT_BATCH_SIZE * 10) == 0 or written == total:
+                log(f"  submissions: {written}/{total}")
+
+        generate_submissions(db, rng, size, documents + large, progress)
+        rebuild_rollups(db)
+        db.commit()
+        log(f"  generated in {time.perf_counter() - started:.1f}s")
+        return describe_dataset(db)
+    finally:
+        db.close()
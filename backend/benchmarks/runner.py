@@ -0,0 +1,160 @@
+"""
+Drives the FastAPI app in-process (httpx over ASGI, no server or network)
+and reports latency percentiles, throughput and peak memory per scenario.
+"""
+import asyncio
+import json
+import math
+import platform
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Dict, List
+import httpx
+from benchmarks.scenarios import Scenario
+
+# Differences below these are noise whatever the relative change
+LATENCY_FLOOR_MS = 1.0
+MEMORY_FLOOR_KIB = 256
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+async def _send(client: httpx.AsyncClient, scenario: Scenario, n: int) -> int:
+    response = await client.request(
+        scenario.method,
+        scenario.path,
+        json=scenario.body(n) if scenario.body else None,
+        headers=scenario.headers,
+    )
+    return response.status_code
+
+
+async def measure(
+    client: httpx.AsyncClient,
+    scenario: Scenario,
+    requests: int,
+    concurrency: int,
+    warmup: int,
+    memory_requests: int,
+) -> Dict[str, float]:
+    for n in range(warmup):
+        await _send(client, scenario, n)
+
+    latencies: List[float] = []
+    errors = 0
+    next_request = iter(range(warmup, warmup + requests))
+
+    async def worker():
+        nonlocal errors
+        for n in next_request:
+            start = time.perf_counter()
+            status = await _send(client, scenario, n)
+            latencies.append(time.perf_counter() - start)
+            if status >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    # Peak Python heap growth while serving requests one at a time, measured
+    # separately because tracing allocations slows everything down
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    for n in range(memory_requests):
+        await _send(client, scenario, warmup + requests + n)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "throughput_rps": round(requests / elapsed, 1) if elapsed else 0.0,
+        "peak_memory_kib": round((peak - baseline) / 1024, 1),
+    }
+
+
+async def run_scenarios(
+    app,
+    scenarios: List[Scenario],
+    requests: int = 200,
+    concurrency: int = 4,
+    warmup: int = 10,
+    memory_requests: int = 5,
+    log=print,
+) -> Dict[str, dict]:
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        for scenario in scenarios:
+            results[scenario.name] = await measure(
+                client, scenario, requests, concurrency, warmup, memory_requests
+            )
+            log(format_row(scenario.name, results[scenario.name]))
+    return results
+
+
+def run_metadata(dataset: dict, backend: str, **settings) -> dict:
+    return {
+        "dataset": dataset["size"],
+        "backend": backend,
+        "python": platform.python_version(),
+        "recorded_at": datetime.utcnow().isoformat(timespec="seconds"),
+        **settings,
+    }
+
+
+HEADER = f"{'scenario':32} {'p50 ms':>9} {'p99 ms':>9} {'req/s':>9} {'peak KiB':>10} {'errors':>7}"
+
+
+def format_row(name: str, result: dict) -> str:
+    return (
+        f"{name:32} {result['p50_ms']:9.2f} {result['p99_ms']:9.2f} "
+        f"{result['throughput_rps']:9.1f} {result['peak_memory_kib']:10.1f} {result['errors']:7d}"
+    )
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], max_regression: float) -> List[str]:
+    """Regressions of results against baseline beyond max_regression (0.25 = 25% worse)"""
+    problems = []
+    limit = 1 + max_regression
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        for key in ("p50_ms", "p99_ms"):
+            if current[key] > previous[key] * limit and current[key] - previous[key] > LATENCY_FLOOR_MS:
+                problems.append(f"{name}: {key} {previous[key]:.2f} -> {current[key]:.2f}")
+        if current["throughput_rps"] * limit < previous["throughput_rps"]:
+            problems.append(
+                f"{name}: throughput_rps {previous['throughput_rps']:.1f} -> {current['throughput_rps']:.1f}"
+            )
+        if (
+            current["peak_memory_kib"] > previous["peak_memory_kib"] * limit
+            and current["peak_memory_kib"] - previous["peak_memory_kib"] > MEMORY_FLOOR_KIB
+        ):
+            problems.append(
+                f"{name}: peak_memory_kib {previous['peak_memory_kib']:.1f} -> {current['peak_memory_kib']:.1f}"
+            )
+    return problems
+
+
+def save_results(path: str, metadata: dict, results: Dict[str, dict]) -> None:
+    with open(path, "w") as f:
+        json.dump({"metadata": metadata, "scenarios": results}, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def load_results(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
@@ -0,0 +1,74 @@
+"""
+The endpoints exercised by the benchmarks, with paths filled in from the
+generated dataset. Scenario names are the keys of results and baselines.
+"""
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+AUTH_HEADERS = {"X-Bypass-Auth": "true"}
+
+
+class Scenario(NamedTuple):
+    name: str
+    method: str
+    path: str
+    # Builds the JSON body of the nth request (writes vary their payload)
+    body: Optional[Callable[[int], dict]] = None
+    headers: Optional[Dict[str, str]] = None
+
+
+def _submission_body(document_id: int) -> Callable[[int], dict]:
+    def body(n: int) -> dict:
+        return {
+            "document_id": document_id,
+            "answers": [
+                {"id": "n1", "label": "Measurement 1", "value": n % 25, "result": "pass"},
+                {"id": "n2", "label": "Measurement 2", "value": (n * 7) % 25, "result": "pass"},
+                {"id": "n3", "label": "Measurement 3", "value": 5, "result": "pass"},
+                {"id": "n4", "label": "Measurement 4", "value": 5, "result": "pass"},
+                {"id": "d1", "label": "Action", "value": "ok", "result": "pass"},
+            ],
+        }
+    return body
+
+
+def build_scenarios(dataset: dict) -> List[Scenario]:
+    hot = dataset["hot_document"]
+    return [
+        Scenario("nodes.tree", "GET", "/api/nodes/"),
+        Scenario("nodes.tree_depth_2", "GET", "/api/nodes/?depth=2"),
+        Scenario("nodes.subtree_deep", "GET", f"/api/nodes/{dataset['deep_root']}/subtree"),
+        Scenario("nodes.subtree_wide", "GET", f"/api/nodes/{dataset['wide_root']}/subtree?depth=1"),
+        Scenario("nodes.ancestors_deep", "GET", f"/api/nodes/{dataset['deep_leaf']}/ancestors"),
+        Scenario("nodes.stats", "GET", f"/api/nodes/{dataset['balanced_root']}/stats"),
+        Scenario(
+            "documents.list_subtree",
+            "GET",
+            f"/api/documents/?node_id={dataset['balanced_root']}&include_descendants=true&limit=50",
+        ),
+        Scenario("documents.summary", "GET", "/api/documents/summary?limit=200"),
+        Scenario("documents.get_large", "GET", f"/api/documents/{dataset['large_document']}"),
+        Scenario("documents.schema_large", "GET", f"/api/documents/{dataset['large_document']}/schema"),
+        Scenario("documents.search", "GET", "/api/documents/search?q=calibration%20torque&limit=20"),
+        Scenario("submissions.list", "GET", "/api/submissions/?limit=100", headers=AUTH_HEADERS),
+        Scenario(
+            "submissions.list_document",
+            "GET",
+            f"/api/submissions/?document_id={hot}&limit=100",
+            headers=AUTH_HEADERS,
+        ),
+        Scenario(
+            "submissions.filter_control",
+            "GET",
+            f"/api/submissions/?document_id={hot}&control_id=d1&control_value=ok&limit=100",
+            headers=AUTH_HEADERS,
+        ),
+        Scenario("submissions.aggregates", "GET", f"/api/submissions/aggregates?document_id={hot}", headers=AUTH_HEADERS),
+        Scenario("submissions.create", "POST", "/api/submissions/", body=_submission_body(hot), headers=AUTH_HEADERS),
+    ]
+
+
+def select_scenarios(scenarios: List[Scenario], patterns: Optional[List[str]]) -> List[Scenario]:
+    """Scenarios whose name starts with any of patterns (all when patterns is empty)"""
+    if not patterns:
+        return scenarios
+    return [s for s in scenarios if any(s.name.startswith(p) for p in patterns)]
@@ -2,10 +2,86 @@
 Initialize the database with tables
 Run this script to create all database tables
 """
-from app.models.database import init_db
+from sqlalchemy import and_, func, select, tuple_, update
+from app.models.database import init_db, SessionLocal, TreeNode, TreeNodeClosure, CacheVersion, Document, DocumentRevision
+from app.services.form_schema import parse_form_schema
+from app.services.node_tree import rebuild_closure
+from app.services.revisions import load_revision, record_revision
+from app.services.tree_cache import TREE_VERSION_KEY
+
+BACKFILL_BATCH_SIZE = 500
+
+
+def backfill_closure():
+    """Populate the node closure table and tree version row for databases created before they existed"""
+    db = SessionLocal()
+    try:
+        nodes = db.query(func.count(TreeNode.id)).scalar()
+        rows = db.query(func.count()).select_from(TreeNodeClosure).scalar()
+        if nodes and not rows:
+            print(f"Building closure table for {nodes} nodes...")
+            rebuild_closure(db)
+        if not db.get(CacheVersion, TREE_VERSION_KEY):
+            db.add(CacheVersion(name=TREE_VERSION_KEY, version=1))
+        db.commit()
+    finally:
+        db.close()
+
+
+def backfill_form_schemas():
+    """Store compiled form schemas for documents and revisions saved before schemas were kept with revisions"""
+    db = SessionLocal()
+    try:
+        unrevised = db.execute(
+            select(Document.id, Document.version, Document.title, Document.content)
+            .outerjoin(
+                DocumentRevision,
+                and_(DocumentRevision.document_id == Document.id, DocumentRevision.version == Document.version),
+            )
+            .where(DocumentRevision.version.is_(None))
+        ).all()
+        for row in unrevised:
+            record_revision(db, row.id, row.version, row.title, row.content)
+        if unrevised:
+            print(f"Recorded the current revision of {len(unrevised)} documents")
+        db.commit()
+
+        compiled = 0
+        last = (0, 0)
+        while True:
+            batch = db.execute(
+                select(DocumentRevision.document_id, DocumentRevision.version)
+                .where(
+                    DocumentRevision.form_schema.is_(None),
+                    tuple_(DocumentRevision.document_id, DocumentRevision.version) > tuple_(*last),
+                )
+                .order_by(DocumentRevision.document_id, DocumentRevision.version)
+                .limit(BACKFILL_BATCH_SIZE)
+            ).all()
+            if not batch:
+                break
+            for row in batch:
+                revision = load_revision(db, row.document_id, row.version)
+                if revision is None:
+                    continue
+                db.execute(
+                    update(DocumentRevision)
+                    .where(DocumentRevision.document_id == row.document_id, DocumentRevision.version == row.version)
+                    .values(form_schema=parse_form_schema(revision["content"]))
+                )
+            db.commit()
+            compiled += len(batch)
+            last = tuple(batch[-1])
+        if compiled:
+            print(f"Compiled form schemas of {compiled} revisions")
+    finally:
+        db.close()
+
 
 if __name__ == "__main__":
     print("Initializing database...")
     init_db()
+    backfill_closure()
+    backfill_form_schemas()
     print("Database initialized successfully!")
 
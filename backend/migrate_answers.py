@@ -0,0 +1,24 @@
+"""
+Rewrite legacy (dict-shaped) submission answers into the canonical list shape
+Safe to stop and re-run at any time; already migrated rows are skipped.
+Usage: python migrate_answers.py [batch_size] [pause_seconds]
+"""
+import sys
+from app.models.database import SessionLocal
+from app.services.answers import MIGRATION_BATCH_SIZE, migrate_legacy_answers
+
+if __name__ == "__main__":
+    batch_size = int(sys.argv[1]) if len(sys.argv) > 1 else MIGRATION_BATCH_SIZE
+    pause = float(sys.argv[2]) if len(sys.argv) > 2 else 0.0
+    print("Migrating legacy submission answers...")
+    db = SessionLocal()
+    try:
+        migrated = migrate_legacy_answers(
+            db,
+            batch_size=batch_size,
+            pause=pause,
+            progress=lambda done, last_id: print(f"  {done} rows migrated (last id {last_id})"),
+        )
+    finally:
+        db.close()
+    print(f"Migration complete: {migrated} rows migrated.")
@@ -0,0 +1,20 @@
+"""
+Run purge jobs left unfinished (pending, interrupted or failed), e.g. after
+the API worker that started them was restarted
+Usage: python purge_nodes.py [job_id] [batch_size]
+"""
+import sys
+from app.models.database import SessionLocal
+from app.services.purge import PURGE_BATCH_SIZE, run_job, unfinished_jobs
+
+if __name__ == "__main__":
+    batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else PURGE_BATCH_SIZE
+    db = SessionLocal()
+    try:
+        job_ids = [int(sys.argv[1])] if len(sys.argv) > 1 else unfinished_jobs(db)
+        for job_id in job_ids:
+            print(f"Running purge job {job_id}...")
+            run_job(db, job_id, batch_size)
+    finally:
+        db.close()
+    print(f"{len(job_ids)} purge job(s) processed.")
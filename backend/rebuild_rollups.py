@@ -0,0 +1,18 @@
+"""
+Recompute the per-control pass/warning/fail rollups from all submissions
+Usage: python rebuild_rollups.py [document_id]
+"""
+import sys
+from app.models.database import SessionLocal
+from app.services.rollups import rebuild_rollups
+
+if __name__ == "__main__":
+    document_id = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    print("Rebuilding rollups...")
+    db = SessionLocal()
+    try:
+        scanned = rebuild_rollups(db, document_id)
+        db.commit()
+    finally:
+        db.close()
+    print(f"Rollups rebuilt from {scanned} submissions.")
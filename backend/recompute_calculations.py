@@ -0,0 +1,27 @@
+"""
+Re-derive Calculate values and pass/warning/fail results of every submission
+of a document from its current form (after a formula or bound changed)
+Usage: python recompute_calculations.py <document_id> [batch_size]
+"""
+import sys
+from app.models.database import SessionLocal
+from app.services.calculations import RECOMPUTE_BATCH_SIZE, recompute_document
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    document_id = int(sys.argv[1])
+    batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else RECOMPUTE_BATCH_SIZE
+    print(f"Recomputing submissions of document {document_id}...")
+    db = SessionLocal()
+    try:
+        counts = recompute_document(
+            db,
+            document_id,
+            batch_size=batch_size,
+            progress=lambda scanned, updated: print(f"  {scanned} scanned, {updated} updated"),
+        )
+    finally:
+        db.close()
+    print(f"Recompute complete: {counts['scanned']} scanned, {counts['updated']} updated.")
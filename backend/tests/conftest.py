@@ -0,0 +1,5 @@
+import os
+import tempfile
+
+# The app reads its database settings at import time
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}")
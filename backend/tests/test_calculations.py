@@ -0,0 +1,43 @@
+from app.services.calculations import derive_answers
+from app.services.form_schema import CompiledForm, parse_form_schema
+from app.services.rollups import count_answers
+
+FORM = CompiledForm(
+    parse_form_schema(
+        '<NumberInput id="a" label="A" />\n\n'
+        '<NumberInput id="b" label="B" />\n\n'
+        '<Calculate id="total" label="Total" expression="a + b" precision={2} pass={{min: 0, max: 10}} />\n\n'
+        '<Calculate id="larger" label="Larger" expression="a > b ? a : b" precision={0} />'
+    )
+)
+
+
+def _answer(control_id, value, result="pass"):
+    return {"id": control_id, "label": control_id, "value": value, "result": result}
+
+
+def _by_id(answers):
+    return {answer["id"]: answer for answer in answers}
+
+
+def test_calculate_is_evaluated_on_the_server():
+    answers = _by_id(derive_answers(FORM, [_answer("a", 4), _answer("b", 8), _answer("total", 1)]))
+    assert answers["total"]["value"] == 12
+    assert answers["total"]["result"] == "fail"
+
+
+def test_unsupported_formula_keeps_the_submitted_answer():
+    submitted = _answer("larger", 8)
+    answers = _by_id(derive_answers(FORM, [_answer("a", 4), _answer("b", 8), submitted]))
+    assert answers["larger"] == submitted
+
+
+def test_unsupported_formula_adds_no_answer():
+    answers = _by_id(derive_answers(FORM, [_answer("a", 4), _answer("b", 8)]))
+    assert "larger" not in answers
+
+
+def test_calculate_with_missing_inputs_adds_no_answer():
+    answers = derive_answers(FORM, [_answer("a", 4)])
+    assert "total" not in _by_id(answers)
+    assert (1, "total") not in count_answers({}, 1, answers)
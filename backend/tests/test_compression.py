@@ -0,0 +1,29 @@
+from fastapi.testclient import TestClient
+from app.api.main import app
+from app.models.database import init_db
+
+
+def test_compressed_responses_have_their_own_etag():
+    init_db()
+    client = TestClient(app)
+    node_id = client.post("/api/nodes/", json={"name": "compression"}).json()["id"]
+    content = "Compressible procedure text. " * 200
+    document_id = client.post(
+        "/api/documents/", json={"node_id": node_id, "title": "t", "content": content}
+    ).json()["id"]
+    path = f"/api/documents/{document_id}"
+
+    plain = client.get(path, headers={"Accept-Encoding": "identity"})
+    gzipped = client.get(path, headers={"Accept-Encoding": "gzip"})
+
+    assert "content-encoding" not in plain.headers
+    assert gzipped.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in gzipped.headers["vary"]
+    assert gzipped.headers["etag"] == plain.headers["etag"][:-1] + '-gzip"'
+
+    revalidated = client.get(path, headers={"Accept-Encoding": "gzip", "If-None-Match": gzipped.headers["etag"]})
+    assert revalidated.status_code == 304
+    assert revalidated.headers["etag"] == gzipped.headers["etag"]
+    unchanged = client.get(path, headers={"Accept-Encoding": "identity", "If-None-Match": plain.headers["etag"]})
+    assert unchanged.status_code == 304
+    assert unchanged.headers["etag"] == plain.headers["etag"]
@@ -0,0 +1,22 @@
+import json
+from fastapi.testclient import TestClient
+from app.api.main import app
+from app.models.database import init_db
+
+HEADERS = {"X-Bypass-Auth": "true"}
+
+
+def test_export_streams_every_submission():
+    init_db()
+    client = TestClient(app)
+    node_id = client.post("/api/nodes/", json={"name": "export"}).json()["id"]
+    document_id = client.post("/api/documents/", json={"node_id": node_id, "title": "t", "content": "x"}).json()["id"]
+    for value in range(3):
+        answers = [{"id": "a", "label": "A", "value": value, "result": "pass"}]
+        client.post("/api/submissions/", json={"document_id": document_id, "answers": answers}, headers=HEADERS)
+
+    params = {"document_id": document_id}
+    ndjson = client.get("/api/submissions/export", params=params, headers=HEADERS)
+    assert [json.loads(line)["answers"][0]["value"] for line in ndjson.text.splitlines()] == [0, 1, 2]
+    csv = client.get("/api/submissions/export", params={**params, "format": "csv"}, headers=HEADERS)
+    assert len(csv.text.splitlines()) == 4
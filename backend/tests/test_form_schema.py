@@ -0,0 +1,49 @@
+from fastapi.testclient import TestClient
+from sqlalchemy import null, update
+from app.api.main import app
+from app.models.database import DocumentRevision, SessionLocal, init_db
+from init_db import backfill_form_schemas
+
+HEADERS = {"X-Bypass-Auth": "true"}
+FORM = '<NumberInput id="n" label="N" required />'
+
+
+def _node(client):
+    return client.post("/api/nodes/", json={"name": "forms"}).json()["id"]
+
+
+def test_reused_document_id_gets_its_own_form():
+    init_db()
+    client = TestClient(app)
+    node_id = _node(client)
+    first = client.post("/api/documents/", json={"node_id": node_id, "title": "a", "content": FORM}).json()
+    # Compile and cache the first document's form
+    assert client.post(
+        "/api/submissions/", json={"document_id": first["id"], "answers": []}, headers=HEADERS
+    ).status_code == 422
+    client.delete(f"/api/documents/{first['id']}")
+
+    second = client.post("/api/documents/", json={"node_id": node_id, "title": "b", "content": "No form"}).json()
+    assert second["id"] == first["id"]
+    created = client.post("/api/submissions/", json={"document_id": second["id"], "answers": []}, headers=HEADERS)
+    assert created.status_code == 200
+
+
+def test_schemas_of_old_revisions_are_backfilled():
+    init_db()
+    client = TestClient(app)
+    document = client.post("/api/documents/", json={"node_id": _node(client), "title": "a", "content": FORM}).json()
+    db = SessionLocal()
+    try:
+        db.execute(
+            update(DocumentRevision).where(DocumentRevision.document_id == document["id"]).values(form_schema=null())
+        )
+        db.commit()
+    finally:
+        db.close()
+    assert client.get(f"/api/documents/{document['id']}/schema").status_code == 404
+
+    backfill_form_schemas()
+
+    schema = client.get(f"/api/documents/{document['id']}/schema").json()
+    assert [control["id"] for control in schema["controls"]] == ["n"]
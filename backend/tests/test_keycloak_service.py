@@ -0,0 +1,107 @@
+import asyncio
+import time
+import httpx
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jose import jwk, jwt
+from app.services.keycloak_service import KeycloakService
+
+REALM_URL = "http://keycloak.test/realms/docuforms"
+JWKS_URI = f"{REALM_URL}/protocol/openid-connect/certs"
+
+
+def _rsa_key(kid: str):
+    """A fresh RSA key as (private PEM, public JWK)"""
+    private = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    private_pem = private.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    )
+    public_pem = private.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+    public_jwk = {**jwk.construct(public_pem, "RS256").to_dict(), "kid": kid, "use": "sig"}
+    return private_pem, public_jwk
+
+
+class StubProvider:
+    """OIDC discovery and JWKS endpoints serving whatever keys are currently published"""
+
+    def __init__(self, *keys):
+        self.keys = list(keys)
+        self.jwks_requests = 0
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("/.well-known/openid-configuration"):
+            return httpx.Response(200, json={"issuer": REALM_URL, "jwks_uri": JWKS_URI})
+        self.jwks_requests += 1
+        return httpx.Response(200, json={"keys": self.keys})
+
+
+def _service(provider: StubProvider) -> KeycloakService:
+    client = httpx.AsyncClient(transport=httpx.MockTransport(provider.handle))
+    service = KeycloakService("http://keycloak.test", "docuforms", async_client=client)
+    service.leeway = 0
+    return service
+
+
+def _token(private_pem, kid: str, expires_in: int = 300) -> str:
+    now = int(time.time())
+    claims = {"sub": "user-1", "iss": REALM_URL, "iat": now, "exp": now + expires_in, "groups": ["Admins"]}
+    return jwt.encode(claims, private_pem, algorithm="RS256", headers={"kid": kid})
+
+
+def test_valid_signature():
+    private_pem, public_jwk = _rsa_key("k1")
+    service = _service(StubProvider(public_jwk))
+    user = asyncio.run(service.averify_token(_token(private_pem, "k1")))
+    assert user["id"] == "user-1"
+    assert user["groups"] == ["Admins"]
+
+
+def test_token_signed_by_another_key_is_rejected():
+    _, public_jwk = _rsa_key("k1")
+    other_pem, _ = _rsa_key("k1")
+    service = _service(StubProvider(public_jwk))
+    with pytest.raises(Exception, match="Invalid token"):
+        asyncio.run(service.adecode_token(_token(other_pem, "k1")))
+
+
+def test_expired_token_is_rejected():
+    private_pem, public_jwk = _rsa_key("k1")
+    service = _service(StubProvider(public_jwk))
+    with pytest.raises(Exception, match="expired"):
+        asyncio.run(service.adecode_token(_token(private_pem, "k1", expires_in=-60)))
+
+
+def test_unknown_kid_refetches_the_jwks():
+    old_pem, old_jwk = _rsa_key("k1")
+    new_pem, new_jwk = _rsa_key("k2")
+    provider = StubProvider(old_jwk)
+    service = _service(provider)
+    service.min_refresh_interval = 0
+
+    async def rotate():
+        await service.adecode_token(_token(old_pem, "k1"))
+        provider.keys = [old_jwk, new_jwk]
+        return await service.adecode_token(_token(new_pem, "k2"))
+
+    assert asyncio.run(rotate())["sub"] == "user-1"
+    assert provider.jwks_requests == 2
+
+
+def test_unknown_kid_refetch_is_rate_limited():
+    private_pem, public_jwk = _rsa_key("k1")
+    provider = StubProvider(public_jwk)
+    service = _service(provider)
+    service.min_refresh_interval = 60
+
+    async def forged(count):
+        await service.adecode_token(_token(private_pem, "k1"))
+        for _ in range(count):
+            with pytest.raises(Exception, match="Unknown signing key"):
+                await service.adecode_token(_token(private_pem, "unknown"))
+
+    asyncio.run(forged(5))
+    # The initial fetch plus a single forced refresh for all five unknown kids
+    assert provider.jwks_requests == 2
@@ -0,0 +1,10 @@
+from fastapi.testclient import TestClient
+from app.api.main import app
+
+
+def test_runtime_metrics_with_multiprocess_registry(tmp_path, monkeypatch):
+    monkeypatch.setenv("PROMETHEUS_MULTIPROC_DIR", str(tmp_path))
+    response = TestClient(app).get("/metrics")
+    assert response.status_code == 200
+    assert "auth_token_cache_hits" in response.text
+    assert "auth_token_cache_entries" in response.text
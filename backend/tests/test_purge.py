@@ -0,0 +1,48 @@
+from fastapi.testclient import TestClient
+from app.api.main import app
+from app.models.database import SessionLocal, init_db
+from app.services import purge
+
+HEADERS = {"X-Bypass-Auth": "true"}
+ANSWERS = [{"id": "a", "label": "A", "value": 1, "result": "pass"}]
+
+
+def test_subtree_queued_for_purging_is_hidden():
+    init_db()
+    client = TestClient(app)
+    node_id = client.post("/api/nodes/", json={"name": "doomed"}).json()["id"]
+    document = client.post("/api/documents/", json={"node_id": node_id, "title": "t", "content": "x"})
+    document_id = document.json()["id"]
+    etag = client.get(f"/api/documents/{document_id}").headers["ETag"]
+    submission_id = client.post(
+        "/api/submissions/", json={"document_id": document_id, "answers": ANSWERS}, headers=HEADERS
+    ).json()["id"]
+
+    # Queue the purge without running it, as if the background job were still pending
+    db = SessionLocal()
+    try:
+        purge.hide_subtree(db, node_id)
+        db.commit()
+    finally:
+        db.close()
+
+    assert client.get(f"/api/documents/{document_id}").status_code == 404
+    assert client.get(f"/api/documents/{document_id}", headers={"If-None-Match": etag}).status_code == 404
+    for path in ("revisions", "revisions/1", "schema", "diff?from=1&to=1"):
+        assert client.get(f"/api/documents/{document_id}/{path}").status_code == 404, path
+    assert client.delete(f"/api/documents/{document_id}").status_code == 404
+    listed = client.get("/api/submissions/", params={"document_id": document_id}, headers=HEADERS)
+    assert listed.json() == []
+    exported = client.get("/api/submissions/export", params={"document_id": document_id}, headers=HEADERS)
+    assert exported.text == ""
+    assert client.get(f"/api/submissions/{submission_id}", headers=HEADERS).status_code == 404
+    created = client.post(
+        "/api/submissions/", json={"document_id": document_id, "answers": ANSWERS}, headers=HEADERS
+    )
+    assert created.status_code == 404
+    batch = client.post(
+        "/api/submissions/batch", json={"items": [{"document_id": document_id, "answers": ANSWERS}]}, headers=HEADERS
+    )
+    assert batch.json()["results"][0]["status"] == "error"
+    aggregates = client.get("/api/submissions/aggregates", headers=HEADERS).json()
+    assert document_id not in [rollup["document_id"] for rollup in aggregates]
@@ -0,0 +1,57 @@
+"""Pinned SQL statement counts of the main read endpoints; a change here usually means an N+1"""
+import pytest
+from fastapi.testclient import TestClient
+from app.api.main import app
+from app.api.query_budget import count_queries
+from app.models.database import init_db
+
+HEADERS = {"X-Bypass-Auth": "true"}
+ANSWERS = [{"id": "a", "label": "A", "value": 1, "result": "pass"}]
+
+
+@pytest.fixture(scope="module")
+def tree():
+    init_db()
+    client = TestClient(app)
+    root = client.post("/api/nodes/", json={"name": "query counts"}).json()["id"]
+    documents = []
+    for index in range(5):
+        node_id = client.post("/api/nodes/", json={"name": f"child {index}", "parent_id": root}).json()["id"]
+        document_id = client.post(
+            "/api/documents/", json={"node_id": node_id, "title": f"doc {index}", "content": "x"}
+        ).json()["id"]
+        client.post("/api/submissions/", json={"document_id": document_id, "answers": ANSWERS}, headers=HEADERS)
+        documents.append(document_id)
+    return client, root, documents
+
+
+def _count(client, path):
+    with count_queries() as queries:
+        response = client.get(path, headers=HEADERS)
+    assert response.status_code == 200
+    return queries
+
+
+def test_node_tree(tree):
+    client, root, _ = tree
+    # Tree version, the nodes with their documents and the version again to cache
+    # the result; later requests at the same version are served from the cache
+    _count(client, "/api/nodes/").assert_count(3)
+    _count(client, "/api/nodes/").assert_count(1)
+    _count(client, f"/api/nodes/{root}/subtree").assert_count(3)
+
+
+def test_document_list(tree):
+    client, root, _ = tree
+    _count(client, f"/api/documents/?node_id={root}&include_descendants=true").assert_count(1)
+
+
+def test_document_detail(tree):
+    client, _, documents = tree
+    # The document and the hidden-subtree check
+    _count(client, f"/api/documents/{documents[0]}").assert_count(2)
+
+
+def test_submission_list(tree):
+    client, _, _ = tree
+    _count(client, "/api/submissions/").assert_count(1)
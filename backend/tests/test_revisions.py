@@ -0,0 +1,17 @@
+from fastapi.testclient import TestClient
+from app.api.main import app
+from app.models.database import init_db
+
+
+def test_rename_updates_the_current_revision_title():
+    init_db()
+    client = TestClient(app)
+    node_id = client.post("/api/nodes/", json={"name": "revisions"}).json()["id"]
+    document = client.post("/api/documents/", json={"node_id": node_id, "title": "Old", "content": "x"}).json()
+
+    renamed = client.put(f"/api/documents/{document['id']}", json={"title": "New"}).json()
+
+    assert renamed["version"] == document["version"]
+    revision = client.get(f"/api/documents/{document['id']}/revisions/{renamed['version']}").json()
+    assert revision["title"] == "New"
+    assert revision["content"] == "x"
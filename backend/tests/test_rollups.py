@@ -0,0 +1,25 @@
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+from app.api.main import app
+from app.models.database import ControlRollup, SessionLocal, init_db
+from app.services import rollups
+
+
+def _delta(label, passed, failed):
+    return {"label": label, "pass_count": passed, "warning_count": 0, "fail_count": failed}
+
+
+def test_unlabelled_answer_keeps_the_stored_label():
+    init_db()
+    client = TestClient(app)
+    node_id = client.post("/api/nodes/", json={"name": "rollups"}).json()["id"]
+    document_id = client.post("/api/documents/", json={"node_id": node_id, "title": "t", "content": "x"}).json()["id"]
+    db = SessionLocal()
+    try:
+        rollups.add_counts(db, {(document_id, "a"): _delta("Pressure", 1, 0)})
+        rollups.add_counts(db, {(document_id, "a"): _delta("", 0, 1)})
+        db.commit()
+        rollup = db.scalars(select(ControlRollup).where(ControlRollup.document_id == document_id)).one()
+        assert (rollup.label, rollup.pass_count, rollup.fail_count) == ("Pressure", 1, 1)
+    finally:
+        db.close()
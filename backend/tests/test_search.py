@@ -0,0 +1,35 @@
+from fastapi.testclient import TestClient
+from app.api.main import app
+from app.models.database import SessionLocal, init_db
+from app.services import search
+
+
+def _document(client, title, content):
+    node_id = client.post("/api/nodes/", json={"name": "search"}).json()["id"]
+    return client.post("/api/documents/", json={"node_id": node_id, "title": title, "content": content}).json()
+
+
+def test_search_highlights_the_page():
+    init_db()
+    client = TestClient(app)
+    filler = " ".join(["gauge"] * 5000)
+    document = _document(client, "Torque check", f"{filler} apply the torque wrench {filler}")
+
+    hits = client.get("/api/documents/search", params={"q": "torque wre"}).json()
+
+    hit = next(hit for hit in hits if hit["id"] == document["id"])
+    assert hit["title_highlight"] == "<mark>Torque</mark> check"
+    assert "<mark>torque</mark> <mark>wrench</mark>" in hit["snippet"]
+    assert hit["snippet"].startswith("…") and hit["snippet"].endswith("…")
+
+
+def test_fallback_search_without_a_full_text_index():
+    init_db()
+    client = TestClient(app)
+    document = _document(client, "Seal inspection", "Replace the pump seal")
+    db = SessionLocal()
+    try:
+        hits = search._like_search(db, "pump SEAL", None, False, 20, None)
+    finally:
+        db.close()
+    assert document["id"] in [hit.id for hit in hits]
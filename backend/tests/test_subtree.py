@@ -0,0 +1,30 @@
+from datetime import datetime
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import select, update
+from app.api.main import app
+from app.models.database import SessionLocal, TreeNode, init_db
+from app.services import node_tree, subtree
+
+
+def test_copy_leaves_nodes_queued_for_purging_behind():
+    init_db()
+    client = TestClient(app)
+    root = client.post("/api/nodes/", json={"name": "copy root"}).json()["id"]
+    doomed = client.post("/api/nodes/", json={"name": "doomed", "parent_id": root}).json()["id"]
+    client.post("/api/nodes/", json={"name": "doomed child", "parent_id": doomed})
+
+    db = SessionLocal()
+    try:
+        db.execute(update(TreeNode).where(TreeNode.id == doomed).values(deleted_at=datetime.utcnow()))
+        counts = subtree.copy_subtree(db, root, None)
+        assert counts["node_count"] == 1
+        copied = db.scalars(select(node_tree.Closure.c.descendant_id).where(
+            node_tree.Closure.c.ancestor_id == counts["node_id"]
+        )).all()
+        assert copied == [counts["node_id"]]
+        with pytest.raises(ValueError):
+            subtree.copy_subtree(db, doomed, None)
+    finally:
+        db.rollback()
+        db.close()
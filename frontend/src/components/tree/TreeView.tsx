@@ -44,7 +44,7 @@ const TreeView: React.FC<TreeViewProps> = ({
   const { data: documents } = useQuery({
     queryKey: ['documents'],
     queryFn: async () => {
-      const response = await documentsApi.getAll();
+      const response = await documentsApi.getSummaries();
       return response.data;
     },
   });
@@ -20,24 +20,51 @@ api.interceptors.request.use((config) => {
 
 export default api;
 
+// List endpoints are paged by cursor; follow X-Next-Cursor until the last page
+const getAllPages = async (url: string, params: Record<string, any> = {}) => {
+  const items: any[] = [];
+  let after: string | undefined;
+  let response;
+  do {
+    response = await api.get(url, { params: { ...params, after, limit: 1000 } });
+    items.push(...response.data);
+    after = response.headers['x-next-cursor'];
+  } while (after);
+  return { ...response, data: items };
+};
+
 // Nodes API
 export const nodesApi = {
   getAll: () => api.get('/api/nodes'),
   getById: (id: number) => api.get(`/api/nodes/${id}`),
+  getSubtree: (id: number, depth?: number) =>
+    api.get(`/api/nodes/${id}/subtree`, { params: { depth } }),
   create: (data: { name: string; parent_id?: number | null }) =>
     api.post('/api/nodes', data),
   update: (id: number, data: { name: string }) =>
     api.put(`/api/nodes/${id}`, data),
   delete: (id: number) => api.delete(`/api/nodes/${id}`),
+  // Move several subtrees under one parent (null for the top level)
+  move: (nodeIds: number[], parentId: number | null) =>
+    api.post('/api/nodes/move', { node_ids: nodeIds, parent_id: parentId }),
+  // Deep-copy a subtree with its documents; parent_id omitted copies next to the original
+  copy: (id: number, data: { parent_id?: number | null; name?: string; include_submissions?: boolean } = {}) =>
+    api.post(`/api/nodes/${id}/copy`, data),
+  // Progress of a large subtree deletion (delete answers 202 with its job_id)
+  getPurgeJob: (jobId: number) => api.get(`/api/nodes/purge-jobs/${jobId}`),
 };
 
 // Documents API
 export const documentsApi = {
-  getAll: (nodeId?: number) => {
-    const url = nodeId ? `/api/documents?node_id=${nodeId}` : '/api/documents';
-    return api.get(url);
-  },
+  getAll: (nodeId?: number) =>
+    getAllPages('/api/documents', nodeId ? { node_id: nodeId } : {}),
+  // Listing without MDX content, for trees and pickers
+  getSummaries: (nodeId?: number) =>
+    getAllPages('/api/documents/summary', nodeId ? { node_id: nodeId } : {}),
   getById: (id: number) => api.get(`/api/documents/${id}`),
+  // Ranked full-text search; results carry <mark>-highlighted title and snippet
+  search: (q: string, params: { node_id?: number; include_descendants?: boolean; limit?: number; after?: string } = {}) =>
+    api.get('/api/documents/search', { params: { q, ...params } }),
   create: (data: { node_id: number; title: string; content: string }) =>
     api.post('/api/documents', data),
   update: (id: number, data: { title?: string; content?: string }) =>
@@ -47,12 +74,8 @@ export const documentsApi = {
 
 // Submissions API
 export const submissionsApi = {
-  getAll: (documentId?: number) => {
-    const url = documentId
-      ? `/api/submissions?document_id=${documentId}`
-      : '/api/submissions';
-    return api.get(url);
-  },
+  getAll: (documentId?: number) =>
+    getAllPages('/api/submissions', documentId ? { document_id: documentId } : {}),
   getById: (id: number) => api.get(`/api/submissions/${id}`),
   create: (data: { document_id: number; answers: ControlAnswer[] }) =>
     api.post('/api/submissions', data),